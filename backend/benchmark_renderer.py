@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the processed-image renderer
+Renders synthetic photos with and without detections and reports the median
+render time and output size per image for each output format and quality,
+next to the previous renderer (font probe, full copy, overlay, JPEG q95)
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'binsavvy.settings')
+
+import django
+django.setup()
+
+from PIL import Image, ImageDraw, ImageFont
+from ml_service.renderer import render_detections
+
+SIZES = [(800, 600), (2048, 1536), (4000, 3000)]
+VARIANTS = [
+    ('JPEG q85', {'image_format': 'JPEG', 'quality': 85, 'progressive': False}),
+    ('JPEG q85 progressive', {'image_format': 'JPEG', 'quality': 85, 'progressive': True}),
+    ('JPEG q75', {'image_format': 'JPEG', 'quality': 75, 'progressive': False}),
+    ('WebP q80', {'image_format': 'WEBP', 'quality': 80}),
+]
+
+
+def make_photo(width, height):
+    """Noisy gradient that compresses roughly like a real photo"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    image = Image.merge('RGB', (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def make_predictions(width, height, count):
+    rng = random.Random(count)
+    return [
+        {
+            'x': rng.uniform(0, width), 'y': rng.uniform(0, height),
+            'width': rng.uniform(20, width / 4), 'height': rng.uniform(20, height / 4),
+            'confidence': rng.uniform(0.2, 0.99), 'class': rng.choice(['Plastic', 'Metal', 'Paper'])
+        }
+        for _ in range(count)
+    ]
+
+
+def render_previous(image_bytes, predictions):
+    """The renderer this module replaced, kept here as the baseline"""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = img.convert('RGB') if img.mode != 'RGB' else img
+        processed = img.copy()
+        draw = ImageDraw.Draw(processed)
+        try:
+            font = ImageFont.truetype("arial.ttf", 16)
+        except OSError:
+            font = ImageFont.load_default()
+        for p in predictions:
+            x1, y1 = p['x'] - p['width'] / 2, p['y'] - p['height'] / 2
+            draw.rectangle([x1, y1, x1 + p['width'], y1 + p['height']], outline='red', width=3)
+            label = f"{p['class']} {p['confidence']:.2f}"
+            draw.rectangle(draw.textbbox((x1, y1 - 20), label, font=font), fill='red')
+            draw.text((x1, y1 - 20), label, fill='white', font=font)
+        if not predictions:
+            overlay = Image.new('RGBA', img.size, (0, 0, 0, 100))
+            processed = Image.alpha_composite(processed.convert('RGBA'), overlay).convert('RGB')
+            ImageDraw.Draw(processed).text((img.width // 2, img.height // 2), "No garbage detected", fill='white', font=font)
+        buffer = io.BytesIO()
+        processed.save(buffer, 'JPEG', quality=95)
+        return buffer
+
+
+def measure(render, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        buffer = render()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), buffer.getbuffer().nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=5, help='renders per case (median is reported)')
+    parser.add_argument('--detections', type=int, default=25, help='boxes per image in the detections case')
+    args = parser.parse_args()
+
+    print("=== BinSavvy Renderer Benchmark ===\n")
+    print(f"{'image':<10}  {'boxes':>5}  {'variant':<22} {'ms/image':>9} {'KB':>8}")
+    print("-" * 60)
+    for width, height in SIZES:
+        image_bytes = make_photo(width, height)
+        for count in (0, args.detections):
+            predictions = make_predictions(width, height, count)
+            cases = [('previous (JPEG q95)', lambda: render_previous(image_bytes, predictions))]
+            cases += [
+                (name, lambda options=options: render_detections(image_bytes, predictions, 0.0, **options))
+                for name, options in VARIANTS
+            ]
+            for name, render in cases:
+                milliseconds, size = measure(render, args.repeats)
+                print(f"{f'{width}x{height}':<10}  {count:>5}  {name:<22} {milliseconds:>9.1f} {size / 1024:>8.1f}")
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
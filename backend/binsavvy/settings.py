@@ -196,4 +196,99 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TASK_ALWAYS_EAGER = False
 CELERY_WORKER_CONCURRENCY = 1
 CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False').lower() == 'true'
- 
\ No newline at end of file
+ 
+# Image record storage: 'database' (ImageUpload model), 'redis' (shared across
+# processes and hosts) or 'memory' (per-process, lost on restart)
+IMAGE_STORE_BACKEND = os.getenv('IMAGE_STORE_BACKEND', 'database')
+IMAGE_STORE_REDIS_URL = os.getenv('IMAGE_STORE_REDIS_URL', CELERY_BROKER_URL)
+
+# Image list pagination: page size when a request sends no limit, and the cap on limit
+IMAGE_LIST_DEFAULT_LIMIT = int(os.getenv('IMAGE_LIST_DEFAULT_LIMIT', '50'))
+IMAGE_LIST_MAX_LIMIT = int(os.getenv('IMAGE_LIST_MAX_LIMIT', '200'))
+
+# ML processing settings
+# When enabled, uploads return 202 right away and ML work runs on a Celery worker
+ML_ASYNC_PROCESSING = os.getenv('ML_ASYNC_PROCESSING', 'False').lower() == 'true'
+# Inline uploads run inference on the received bytes while the Cloudinary
+# upload is in flight, instead of waiting for the stored URL first
+PARALLEL_UPLOAD_INFERENCE = os.getenv('PARALLEL_UPLOAD_INFERENCE', 'True').lower() == 'true'
+
+# Near-duplicate detection by perceptual hash (64-bit dHash)
+# 'reuse' copies the closest match's analysis and stored predictions instead of
+# running inference (matches without a recorded inference frame size are only
+# flagged), 'flag' only records the match, 'off' disables the check
+PHASH_DUPLICATE_ACTION = os.getenv('PHASH_DUPLICATE_ACTION', 'reuse')
+PHASH_DUPLICATE_RADIUS = int(os.getenv('PHASH_DUPLICATE_RADIUS', '6'))
+# The index is updated as uploads arrive and rebuilt from the store in the
+# background this often, to pick up uploads handled by other processes
+PHASH_INDEX_REFRESH_SECONDS = int(os.getenv('PHASH_INDEX_REFRESH_SECONDS', '300'))
+
+# Uploads are re-encoded before storage and inference: long edge capped at
+# IMAGE_MAX_EDGE pixels, EXIF orientation applied, metadata stripped
+IMAGE_NORMALIZE = os.getenv('IMAGE_NORMALIZE', 'True').lower() == 'true'
+IMAGE_MAX_EDGE = int(os.getenv('IMAGE_MAX_EDGE', '2048'))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '85'))
+
+# Inference result cache keyed by image content hash, model and parameters:
+# a per-process LRU in front of Redis (set INFERENCE_CACHE_REDIS_URL='' to skip Redis)
+INFERENCE_CACHE_SIZE = int(os.getenv('INFERENCE_CACHE_SIZE', '512'))
+INFERENCE_CACHE_TTL = int(os.getenv('INFERENCE_CACHE_TTL', '86400'))
+INFERENCE_CACHE_REDIS_URL = os.getenv('INFERENCE_CACHE_REDIS_URL', CELERY_BROKER_URL)
+
+# Roboflow is always queried at this confidence floor; the requested threshold,
+# minimum size and detection cap are applied locally, so reprocessing with a
+# higher threshold re-filters the stored predictions instead of calling the API
+ML_CONFIDENCE_FLOOR = float(os.getenv('ML_CONFIDENCE_FLOOR', '0.05'))
+
+# Local YOLO model: weights file, device ('' lets ultralytics choose, or 'cpu',
+# 'cuda:0', ...) and whether Celery worker processes load it at startup
+YOLO_WEIGHTS = os.getenv('YOLO_WEIGHTS', 'yolov8n-seg.pt')
+YOLO_DEVICE = os.getenv('YOLO_DEVICE', '')
+YOLO_WARMUP = os.getenv('YOLO_WARMUP', 'True').lower() == 'true'
+
+# Local ONNX Runtime backend (backend=onnx): a YOLOv8 detection model exported
+# with `yolo export format=onnx`; class names come from the model metadata
+# unless ONNX_CLASS_NAMES (comma-separated) is set
+ONNX_MODEL_PATH = os.getenv('ONNX_MODEL_PATH', str(BASE_DIR / 'models' / 'waste-detector.onnx'))
+ONNX_INPUT_SIZE = int(os.getenv('ONNX_INPUT_SIZE', '640'))
+ONNX_IOU_THRESHOLD = float(os.getenv('ONNX_IOU_THRESHOLD', '0.45'))
+ONNX_THREADS = int(os.getenv('ONNX_THREADS', '0'))
+ONNX_CLASS_NAMES = os.getenv('ONNX_CLASS_NAMES', '')
+
+# Batched local inference (process_image_batch): images per forward pass and
+# concurrent downloads/uploads while a batch is prepared and fanned out
+ML_BATCH_SIZE = int(os.getenv('ML_BATCH_SIZE', '16'))
+ML_BATCH_DOWNLOAD_WORKERS = int(os.getenv('ML_BATCH_DOWNLOAD_WORKERS', '8'))
+
+# Micro-batching of single-image ONNX requests within a process: flush after
+# this many images or once the oldest has waited this long. Off by default
+# (wait 0 or size 1 disables): a worker that handles one request at a time
+# only pays the wait. Enable it where one process serves concurrent callers
+ML_MICROBATCH_SIZE = int(os.getenv('ML_MICROBATCH_SIZE', '8'))
+ML_MICROBATCH_WAIT_MS = float(os.getenv('ML_MICROBATCH_WAIT_MS', '0'))
+
+# Tiled inference for large photos (Roboflow and ONNX): overlapping tiles of
+# ML_TILE_SIZE pixels plus the full frame, ML_TILE_BATCH tiles in flight at a
+# time, overlaps merged by NMS on intersection over the smaller box
+ML_TILED_INFERENCE = os.getenv('ML_TILED_INFERENCE', 'False').lower() == 'true'
+ML_TILE_SIZE = int(os.getenv('ML_TILE_SIZE', '640'))
+ML_TILE_OVERLAP = int(os.getenv('ML_TILE_OVERLAP', '128'))
+ML_TILE_BATCH = int(os.getenv('ML_TILE_BATCH', '8'))
+ML_TILE_MERGE_THRESHOLD = float(os.getenv('ML_TILE_MERGE_THRESHOLD', '0.5'))
+
+# Processed (overlay) images: 'JPEG' or 'WEBP', encoder quality, progressive
+# JPEG (smaller but slower to encode) and WebP encoder effort (0 fastest, 6 smallest)
+RENDER_FORMAT = os.getenv('RENDER_FORMAT', 'JPEG').upper()
+RENDER_QUALITY = int(os.getenv('RENDER_QUALITY', '85'))
+RENDER_PROGRESSIVE = os.getenv('RENDER_PROGRESSIVE', 'False').lower() == 'true'
+RENDER_WEBP_METHOD = int(os.getenv('RENDER_WEBP_METHOD', '0'))
+
+# Processed images are rendered on request by /api/images/<id>/overlay/ and
+# cached in a byte-bounded LRU (plus a shared directory when OVERLAY_CACHE_DIR
+# is set); EAGER_PROCESSED_UPLOAD restores rendering and uploading them to
+# Cloudinary at inference time
+EAGER_PROCESSED_UPLOAD = os.getenv('EAGER_PROCESSED_UPLOAD', 'False').lower() == 'true'
+OVERLAY_CACHE_BYTES = int(os.getenv('OVERLAY_CACHE_BYTES', str(64 * 1024 * 1024)))
+OVERLAY_CACHE_DIR = os.getenv('OVERLAY_CACHE_DIR', '')
+OVERLAY_CACHE_DISK_BYTES = int(os.getenv('OVERLAY_CACHE_DISK_BYTES', str(512 * 1024 * 1024)))
+OVERLAY_MAX_AGE = int(os.getenv('OVERLAY_MAX_AGE', str(365 * 24 * 3600)))
@@ -0,0 +1,107 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Statuses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HttpClient:
+    """
+    Shared HTTP session for outbound calls (Roboflow inference, image downloads)
+
+    Connections are pooled and kept alive across calls, so repeated requests to
+    the same host skip the TCP and TLS handshakes. Rate limiting and transient
+    5xx responses are retried with jittered exponential backoff.
+    """
+
+    def __init__(self):
+        self.pool_connections = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))
+        self.pool_maxsize = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))
+        self.max_retries = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+        self.backoff_factor = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+        self.backoff_jitter = float(os.getenv('HTTP_BACKOFF_JITTER', '0.5'))
+        self.backoff_max = float(os.getenv('HTTP_BACKOFF_MAX', '10'))
+        self.connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+        self.read_timeout = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    @property
+    def timeout(self):
+        """Default (connect, read) timeout pair"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def _build_retry(self) -> Retry:
+        options = dict(
+            total=self.max_retries,
+            connect=self.max_retries,
+            # A read timeout means the upstream is busy; retry it at most once
+            read=min(1, self.max_retries),
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            # Roboflow inference is idempotent, so POSTs are safe to retry
+            allowed_methods=frozenset({'GET', 'HEAD', 'POST'}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        try:
+            return Retry(backoff_jitter=self.backoff_jitter, backoff_max=self.backoff_max, **options)
+        except TypeError:
+            # urllib3 < 2 has no jitter or backoff cap options
+            return Retry(**options)
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=self._build_retry(),
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        The process-wide session
+
+        A forked worker (Celery prefork, gunicorn) must not share sockets
+        with its parent, so a new session is built whenever the PID changes.
+        """
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def close(self):
+        """Drop pooled connections; the next call builds a fresh session"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._pid = None
+
+
+# Create global instance
+http_client = HttpClient()
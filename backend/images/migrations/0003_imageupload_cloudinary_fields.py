@@ -0,0 +1,104 @@
+# Generated by Django 5.0.2 on 2026-10-16 23:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='imageupload',
+            name='image',
+        ),
+        migrations.RemoveField(
+            model_name='imageupload',
+            name='processed_image',
+        ),
+        migrations.RemoveField(
+            model_name='imageupload',
+            name='user',
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='cloudinary_public_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='detections',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='error_message',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='image_url',
+            field=models.URLField(default='', max_length=500),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='ml_config',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='model_used',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='processed_image_url',
+            field=models.URLField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='task_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='user_id',
+            field=models.CharField(default='1', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='imageupload',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed'), ('ml_failed', 'ML Failed'), ('ml_unavailable', 'ML Unavailable')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='imageupload',
+            name='uploaded_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(fields=['user_id', '-uploaded_at'], name='images_user_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(fields=['status'], name='images_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(fields=['uploaded_at'], name='images_uploaded_at_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-16 23:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0003_imageupload_cloudinary_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageStoreRevision',
+            fields=[
+                ('scope', models.CharField(max_length=80, primary_key=True, serialize=False)),
+                ('revision', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-16 23:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0004_imagestorerevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='duplicate_of',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
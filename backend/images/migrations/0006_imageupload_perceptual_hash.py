@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0005_imageupload_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='duplicate_distance',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageupload',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-16 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0006_imageupload_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='raw_predictions',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-17 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0007_imageupload_raw_predictions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='imageupload',
+            name='images_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(fields=['status', '-uploaded_at', '-id'], name='images_status_uploaded_idx'),
+        ),
+    ]
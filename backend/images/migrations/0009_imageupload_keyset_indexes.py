@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-17 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0008_imageupload_status_uploaded_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='imageupload',
+            name='images_user_uploaded_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='imageupload',
+            name='images_uploaded_at_idx',
+        ),
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(fields=['user_id', '-uploaded_at', '-id'], name='images_user_uploaded_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imageupload',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='images_uploaded_id_idx'),
+        ),
+    ]
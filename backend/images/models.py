@@ -1,5 +1,5 @@
 from django.db import models
-from django.conf import settings
+from django.utils import timezone
 import uuid
 
 class ImageUpload(models.Model):
@@ -8,21 +8,57 @@ class ImageUpload(models.Model):
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('ml_failed', 'ML Failed'),
+        ('ml_unavailable', 'ML Unavailable'),
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='uploads/%Y/%m/%d/')
+    # Users live in the demo user store, so keep the owner ID rather than a foreign key
+    user_id = models.CharField(max_length=64, default='1')
+    image_url = models.URLField(max_length=500)
+    cloudinary_public_id = models.CharField(max_length=255, blank=True, null=True)
     location = models.CharField(max_length=255)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
-    uploaded_at = models.DateTimeField(auto_now_add=True)
+    uploaded_at = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    processed_image = models.ImageField(upload_to='processed/%Y/%m/%d/', null=True, blank=True)
+    processed_image_url = models.URLField(max_length=500, null=True, blank=True)
+    # Summary of the ML analysis; the per-box detections are kept in their own
+    # column so list queries can defer them
     analysis_results = models.JSONField(null=True, blank=True)
+    detections = models.JSONField(null=True, blank=True)
+    # Compact Roboflow predictions at the confidence floor, re-filtered locally on reprocess
+    raw_predictions = models.JSONField(null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    model_used = models.CharField(max_length=100, null=True, blank=True)
+    ml_config = models.JSONField(null=True, blank=True)
+    task_id = models.CharField(max_length=64, null=True, blank=True)
+    # SHA-256 of the uploaded bytes, used to recognise resubmitted photos
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    duplicate_of = models.CharField(max_length=64, null=True, blank=True)
+    # 64-bit dHash (hex) and its Hamming distance to duplicate_of, for near-duplicate shots
+    perceptual_hash = models.CharField(max_length=16, null=True, blank=True)
+    duplicate_distance = models.PositiveSmallIntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ['-uploaded_at']
+        # Keyset pages order by (uploaded_at, id), so each listing index ends with the primary key
+        indexes = [
+            models.Index(fields=['user_id', '-uploaded_at', '-id'], name='images_user_uploaded_id_idx'),
+            models.Index(fields=['status', '-uploaded_at', '-id'], name='images_status_uploaded_idx'),
+            models.Index(fields=['-uploaded_at', '-id'], name='images_uploaded_id_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.email} - {self.uploaded_at}"
+        return f"{self.user_id} - {self.uploaded_at}"
+
+
+class ImageStoreRevision(models.Model):
+    """Counter bumped on every image write, used to build cheap ETags"""
+    scope = models.CharField(max_length=80, primary_key=True)
+    revision = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.scope}: {self.revision}"
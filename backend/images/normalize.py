@@ -0,0 +1,102 @@
+"""
+Normalization of uploaded images before storage and inference
+
+Phones produce 4000px JPEGs, PNG screenshots and EXIF-rotated frames.
+Uploads are sniffed from their header bytes, so anything that is not an
+image is rejected before it reaches Cloudinary or Roboflow. The rest is
+decoded at reduced resolution (JPEG draft mode), turned upright per its EXIF
+orientation and capped at IMAGE_MAX_EDGE pixels on the long edge. It is then
+re-encoded as a metadata-free JPEG at IMAGE_JPEG_QUALITY.
+"""
+
+import io
+from typing import Dict, Tuple, Any
+from django.conf import settings
+from PIL import Image, ImageOps
+
+# Header signatures of the formats accepted for upload
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'BM', 'BMP'),
+    (b'II*\x00', 'TIFF'),
+    (b'MM\x00*', 'TIFF'),
+)
+
+# Bytes of the header needed to recognise every format above
+SNIFF_BYTES = 16
+
+
+class InvalidImageError(ValueError):
+    """Upload is not an image this service can decode"""
+
+
+def sniff_format(header: bytes):
+    """Image format named by the header bytes, or None"""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    for signature, image_format in SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
+def normalize_image(image_bytes: bytes, max_edge: int = None, quality: int = None) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Decode, orient, downscale and re-encode an uploaded image
+
+    Args:
+        image_bytes: Encoded image data as uploaded
+        max_edge: Cap on the longer side in pixels (default IMAGE_MAX_EDGE)
+        quality: JPEG quality of the re-encoded image (default IMAGE_JPEG_QUALITY)
+
+    Returns:
+        (JPEG bytes, info) where info holds the source format, the original and
+        final sizes and byte counts
+
+    Raises:
+        InvalidImageError: the bytes are not a supported, decodable image
+    """
+    max_edge = max_edge or settings.IMAGE_MAX_EDGE
+    quality = quality or settings.IMAGE_JPEG_QUALITY
+
+    source_format = sniff_format(image_bytes[:SNIFF_BYTES])
+    if source_format is None:
+        raise InvalidImageError('File is not a supported image (JPEG, PNG, WebP, GIF, BMP or TIFF)')
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            original_size = img.size
+            scale = min(1.0, max_edge / max(original_size))
+            # JPEG decodes straight to the smallest 1/2, 1/4 or 1/8 scale still above the target
+            img.draft('RGB', (max(1, int(original_size[0] * scale)), max(1, int(original_size[1] * scale))))
+            img = ImageOps.exif_transpose(img)
+
+            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+                # JPEG has no alpha: flatten transparent areas onto white
+                rgba = img.convert('RGBA')
+                img = Image.new('RGB', rgba.size, 'white')
+                img.paste(rgba, mask=rgba.getchannel('A'))
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+            buffer = io.BytesIO()
+            # No exif/icc arguments, so camera metadata (including GPS) is dropped
+            img.save(buffer, format='JPEG', quality=quality, optimize=True)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(f"Could not decode {source_format} image: {str(e)}")
+
+    normalized = buffer.getvalue()
+    return normalized, {
+        'source_format': source_format,
+        'original_width': original_size[0],
+        'original_height': original_size[1],
+        'width': img.width,
+        'height': img.height,
+        'original_bytes': len(image_bytes),
+        'bytes': len(normalized),
+    }
@@ -0,0 +1,260 @@
+"""
+On-demand detection overlays
+
+Processed images are no longer rendered and uploaded at inference time.
+GET /api/images/<id>/overlay/ draws the stored detections onto the stored
+image when it is requested. Results are kept in an LRU bounded by bytes and
+keyed by (image, detections version, style), with an optional disk tier
+shared by the processes of a host.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from http_client import http_client
+from ml_service.renderer import render_detections
+
+# Content types of the overlay formats
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+
+def overlay_version(image):
+    """
+    Version of an image's detections, for cache keys and URLs
+
+    Built from fields that list queries return even when the per-box
+    detections are deferred: the image, the model and detector (tiled or
+    not), the ML parameters and the detection summary, all of which a
+    reprocess changes.
+    """
+    analysis = image.get('analysis_results') or {}
+    ml_config = image.get('ml_config') or {}
+    payload = json.dumps([
+        image.get('image_url'),
+        image.get('model_used'),
+        # Detector id, which carries the tile size and overlap of tiled runs
+        analysis.get('model_used'),
+        bool(ml_config.get('tiled')) or '+tiles' in str(analysis.get('model_used', '')),
+        ml_config,
+        analysis.get('total_detections'),
+        analysis.get('average_confidence'),
+        analysis.get('waste_types'),
+    ], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def overlay_predictions(image):
+    """Stored detections as Roboflow-style predictions in inference-image pixels"""
+    predictions = []
+    for detection in (image.get('analysis_results') or {}).get('detections') or []:
+        if 'bbox' in detection:
+            # Legacy YOLO records: corner box and a numeric class
+            x1, y1, x2, y2 = detection['bbox']
+            predictions.append({
+                'x': (x1 + x2) / 2, 'y': (y1 + y2) / 2, 'width': x2 - x1, 'height': y2 - y1,
+                'confidence': detection.get('confidence', 0), 'class': 'Garbage'
+            })
+        else:
+            predictions.append(detection)
+    return predictions
+
+
+def overlay_frame(image):
+    """
+    Size of the frame the stored detections were found in, or None when unknown
+
+    Runs since compact predictions were kept record the frame with them. Legacy
+    YOLO records only have corner boxes, which ultralytics reported in pixels of
+    the uploaded image, so its stored size is their frame.
+    """
+    detections = (image.get('analysis_results') or {}).get('detections') or []
+    if any('bbox' in detection for detection in detections):
+        if image.get('image_width') and image.get('image_height'):
+            return {'width': image['image_width'], 'height': image['image_height']}
+        return None
+    return (image.get('raw_predictions') or {}).get('image')
+
+
+def render_overlay(image, image_format, quality, min_confidence=0.0):
+    """
+    Download the stored image and draw its detections
+
+    Returns:
+        Encoded overlay bytes
+    """
+    response = http_client.get(image['image_url'])
+    response.raise_for_status()
+
+    # Stored images may be smaller than the frame inference ran on (Cloudinary size limit)
+    return render_detections(response.content, overlay_predictions(image), min_confidence,
+                             image_format=image_format, quality=quality, frame_size=overlay_frame(image)).getvalue()
+
+
+class OverlayRenderer(BaseRenderer):
+    """
+    Lets clients that accept only images (Accept: image/webp) reach the overlay view
+
+    The overlay itself is returned as a plain HttpResponse; this renderer only
+    sees the view's error payloads, which it sends as JSON.
+    """
+    media_type = 'image/*'
+    format = 'image'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return json.dumps(data).encode()
+
+
+class OverlayCache:
+    """
+    LRU of rendered overlays bounded by total bytes, with an optional disk tier
+
+    The lock only guards the in-memory dictionaries; files are read, written
+    and deleted outside it, so one request's disk I/O never blocks another's
+    memory hit. Files are written to a temporary name and renamed into place,
+    so readers in any process see either a whole overlay or none.
+    """
+
+    def __init__(self, max_bytes=None, directory=None, max_disk_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.OVERLAY_CACHE_BYTES
+        self.directory = directory if directory is not None else settings.OVERLAY_CACHE_DIR
+        self.max_disk_bytes = max_disk_bytes if max_disk_bytes is not None else settings.OVERLAY_CACHE_DISK_BYTES
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_entries = None
+        self._disk_bytes = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'renders': 0}
+
+    @staticmethod
+    def make_key(image_id, version, style):
+        """Cache key for one image, detections version and style"""
+        encoded = json.dumps(style, sort_keys=True)
+        return hashlib.sha1(f"{image_id}:{version}:{encoded}".encode()).hexdigest()
+
+    def _remember(self, key, data):
+        # Caller holds the lock
+        if len(data) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _disk_index(self):
+        """Sizes of the files on disk, oldest first; files left by earlier processes are indexed once"""
+        with self._lock:
+            if self._disk_entries is not None:
+                return self._disk_entries
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.overlay'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, name[:-len('.overlay')], stat.st_size))
+        found.sort()
+        with self._lock:
+            if self._disk_entries is None:
+                self._disk_entries = OrderedDict((key, size) for _, key, size in found)
+                self._disk_bytes = sum(self._disk_entries.values())
+            return self._disk_entries
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.overlay")
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return data
+
+        if self.directory:
+            try:
+                with open(self._path(key), 'rb') as cached:
+                    data = cached.read()
+            except OSError:
+                data = None
+
+        with self._lock:
+            if data is None:
+                self._stats['misses'] += 1
+                return None
+            if self._disk_entries is not None and key in self._disk_entries:
+                self._disk_entries.move_to_end(key)
+            self._remember(key, data)
+            self._stats['disk_hits'] += 1
+            return data
+
+    def set(self, key, data):
+        with self._lock:
+            self._stats['renders'] += 1
+            self._remember(key, data)
+        if not self.directory or len(data) > self.max_disk_bytes:
+            return
+
+        try:
+            index = self._disk_index()
+            # Write then rename, so other processes never read a partial file
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(handle, 'wb') as temp_file:
+                    temp_file.write(data)
+                os.replace(temp_path, self._path(key))
+            except OSError:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+        except OSError as e:
+            print(f"Overlay cache: could not write to {self.directory}: {str(e)}")
+            return
+
+        evicted = []
+        with self._lock:
+            self._disk_bytes += len(data) - index.pop(key, 0)
+            index[key] = len(data)
+            while self._disk_bytes > self.max_disk_bytes and index:
+                old_key, size = index.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.unlink(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                memory_entries=len(self._entries),
+                memory_bytes=self._bytes,
+                disk_entries=len(self._disk_entries) if self._disk_entries is not None else None,
+                disk_bytes=self._disk_bytes if self._disk_entries is not None else None,
+            )
+
+
+# Process-wide overlay cache
+overlay_cache = OverlayCache()
@@ -0,0 +1,194 @@
+"""
+Perceptual hashing and near-duplicate lookup for uploaded images
+
+A 64-bit difference hash (dHash) survives recompression, resizing and small
+crops, so near-identical shots of the same pile land within a few bits of
+each other. Hashes are indexed in a BK-tree for Hamming-radius queries.
+"""
+
+import io
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+from PIL import Image
+
+from . import store
+
+HASH_SIZE = 8
+
+
+def dhash(image_bytes: bytes, hash_size: int = HASH_SIZE) -> str:
+    """
+    Compute the difference hash of an encoded image
+
+    Args:
+        image_bytes: Encoded image data (JPEG/PNG/...)
+        hash_size: Width and height of the gradient grid (8 gives a 64-bit hash)
+
+    Returns:
+        The hash as a zero-padded hex string
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        # Let the JPEG decoder downscale while decoding; the hash only needs a thumbnail
+        img.draft('L', (hash_size * 8, hash_size * 8))
+        small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two integer hashes"""
+    return bin(a ^ b).count('1')
+
+
+class _Node:
+    __slots__ = ('value', 'items', 'children')
+
+    def __init__(self, value, item):
+        self.value = value
+        self.items = [item]
+        self.children = {}
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance"""
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value: int, item):
+        """Index item under hash value"""
+        self._size += 1
+        if self._root is None:
+            self._root = _Node(value, item)
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node.value)
+            if distance == 0:
+                node.items.append(item)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(value, item)
+                return
+            node = child
+
+    def search(self, value: int, radius: int):
+        """Return (distance, item) pairs within radius of value, closest first"""
+        results = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node.value)
+            if distance <= radius:
+                results.extend((distance, item) for item in node.items)
+            # Triangle inequality: only subtrees at distance d +/- radius can match
+            for child_distance, child in node.children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        results.sort(key=lambda result: result[0])
+        return results
+
+
+class NearDuplicateIndex:
+    """
+    Process-wide BK-tree of the perceptual hashes in the image store
+
+    Uploads add their hash to the tree as they arrive. The tree is rebuilt
+    from the store on a background thread when first used and then every
+    PHASH_INDEX_REFRESH_SECONDS to pick up writes from other processes;
+    lookups keep using the current tree meanwhile, so no upload waits for
+    the store scan. Until the first rebuild finishes only hashes added in
+    this process are found. Matches are hints only: callers re-read the
+    matched records from the store.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = BKTree()
+        self._built_at = None
+        # Hashes added while a rebuild is scanning the store, or None when none is running
+        self._pending = None
+        self._generation = 0
+
+    def _refresh_in_background(self):
+        # Called with the lock held
+        if self._pending is not None:
+            return
+        refresh_seconds = getattr(settings, 'PHASH_INDEX_REFRESH_SECONDS', 300)
+        if self._built_at is not None and time.monotonic() - self._built_at < refresh_seconds:
+            return
+        self._pending = []
+        threading.Thread(target=self._rebuild_in_background, name='phash-index-rebuild', daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            # The store scan opened database connections for this thread
+            connections.close_all()
+
+    def rebuild(self):
+        """Rebuild the tree from the store, keeping hashes added while the store was scanned"""
+        with self._lock:
+            if self._pending is None:
+                self._pending = []
+            generation = self._generation
+
+        tree, indexed = BKTree(), set()
+        try:
+            for image_id, perceptual_hash in store.image_store.list_perceptual_hashes():
+                tree.add(int(perceptual_hash, 16), image_id)
+                indexed.add(image_id)
+        except Exception as e:
+            print(f"Could not rebuild the near-duplicate index: {str(e)}")
+            tree = None
+
+        with self._lock:
+            if generation != self._generation:
+                # Cleared while scanning
+                return
+            pending, self._pending = self._pending or [], None
+            if tree is not None:
+                for value, image_id in pending:
+                    if image_id not in indexed:
+                        tree.add(value, image_id)
+                self._tree = tree
+            # A failed scan is retried after the refresh interval, not on every upload
+            self._built_at = time.monotonic()
+
+    def add(self, image_id: str, perceptual_hash: str):
+        value = int(perceptual_hash, 16)
+        with self._lock:
+            self._tree.add(value, image_id)
+            if self._pending is not None:
+                self._pending.append((value, image_id))
+            self._refresh_in_background()
+
+    def find(self, perceptual_hash: str, radius: int):
+        """Return (distance, image_id) pairs within radius, closest first"""
+        with self._lock:
+            self._refresh_in_background()
+            return self._tree.search(int(perceptual_hash, 16), radius)
+
+    def clear(self):
+        with self._lock:
+            self._tree = BKTree()
+            self._built_at = None
+            self._pending = None
+            self._generation += 1
+
+
+near_duplicate_index = NearDuplicateIndex()
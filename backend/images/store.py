@@ -0,0 +1,683 @@
+"""
+Image record store shared by the image views and the ML tasks
+"""
+
+import bisect
+import json
+import threading
+from datetime import datetime
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from celery.result import AsyncResult
+
+
+def _parse_uploaded_at(uploaded_at):
+    """Return uploaded_at (ISO string or datetime) as an aware datetime"""
+    if uploaded_at is None:
+        return timezone.now()
+    if isinstance(uploaded_at, str):
+        uploaded_at = datetime.fromisoformat(uploaded_at)
+    if timezone.is_naive(uploaded_at):
+        uploaded_at = timezone.make_aware(uploaded_at)
+    return uploaded_at
+
+
+def _revision_scopes(*user_ids):
+    """Revision counters touched by a write to records owned by user_ids"""
+    return ['all'] + [f"user:{user_id}" for user_id in dict.fromkeys(user_ids)]
+
+
+def _sort_key(uploaded_at, image_id):
+    """Key that orders records by upload time, with image_id as tie-breaker"""
+    return (_parse_uploaded_at(uploaded_at).timestamp(), image_id)
+
+
+class InMemoryImageRepository:
+    """
+    Thread-safe in-memory image repository
+
+    Records are kept in a primary dict keyed by image_id. Secondary indexes
+    hold sorted (upload timestamp, image_id) keys for all records, for each
+    user_id and for each status, so lookups and updates are O(1), listings
+    only touch the relevant index and cursor pages are found by bisection.
+    Records are handed out as copies so callers never mutate shared state
+    without the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._images = {}
+        self._order = []
+        self._by_user = {}
+        self._by_status = {}
+        self._by_hash = {}
+        self._revisions = {}
+
+    def _bump(self, *user_ids):
+        for scope in _revision_scopes(*user_ids):
+            self._revisions[scope] = self._revisions.get(scope, 0) + 1
+
+    def revision(self, user_id=None):
+        """Return the write counter for user_id's records (or for all records)"""
+        with self._lock:
+            return self._revisions.get('all' if user_id is None else f"user:{user_id}", 0)
+
+    def _indexes(self, record):
+        yield self._order
+        yield self._by_user.setdefault(record.get('user_id'), [])
+        yield self._by_status.setdefault(record.get('status'), [])
+        if record.get('content_hash'):
+            yield self._by_hash.setdefault(record['content_hash'], [])
+
+    def _index(self, record):
+        key = _sort_key(record.get('uploaded_at'), record['image_id'])
+        for keys in self._indexes(record):
+            bisect.insort(keys, key)
+
+    def _unindex(self, record):
+        key = _sort_key(record.get('uploaded_at'), record['image_id'])
+        for keys in self._indexes(record):
+            position = bisect.bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+        for index, value in ((self._by_user, record.get('user_id')), (self._by_status, record.get('status')),
+                             (self._by_hash, record.get('content_hash'))):
+            if not index.get(value):
+                index.pop(value, None)
+
+    def add(self, record):
+        """Store a new image record (or replace one with the same image_id)"""
+        record = dict(record)
+        # Records without an owner belong to the admin user (user_id: '1')
+        record.setdefault('user_id', '1')
+        with self._lock:
+            existing = self._images.get(record['image_id'])
+            if existing is not None:
+                self._unindex(existing)
+            self._images[record['image_id']] = record
+            self._index(record)
+            self._bump(record['user_id'], *((existing.get('user_id'),) if existing else ()))
+        return dict(record)
+
+    def get(self, image_id, user_id=None, include_detections=True):
+        """Return a copy of the image record, optionally only if owned by user_id"""
+        with self._lock:
+            record = self._images.get(image_id)
+            if record is None or (user_id is not None and record.get('user_id') != user_id):
+                return None
+            return dict(record) if include_detections else _without_detections(dict(record))
+
+    def update(self, image_id, **fields):
+        """Update fields on an image record, returning the updated copy or None"""
+        with self._lock:
+            record = self._images.get(image_id)
+            if record is None:
+                return None
+            self._unindex(record)
+            previous_user_id = record.get('user_id')
+            record.update(fields)
+            self._index(record)
+            self._bump(previous_user_id, record.get('user_id'))
+            return dict(record)
+
+    def delete(self, image_id):
+        """Remove an image record, returning the removed record or None"""
+        with self._lock:
+            record = self._images.pop(image_id, None)
+            if record is not None:
+                self._unindex(record)
+                self._bump(record.get('user_id'))
+            return record
+
+    def _listing(self, keys, limit=None, after=None, descending=True, include_detections=True):
+        if descending:
+            end = bisect.bisect_left(keys, _sort_key(*after)) if after else len(keys)
+            start = max(0, end - limit) if limit is not None else 0
+            selected = reversed(keys[start:end])
+        else:
+            start = bisect.bisect_right(keys, _sort_key(*after)) if after else 0
+            selected = keys[start:start + limit] if limit is not None else keys[start:]
+        records = [dict(self._images[image_id]) for _, image_id in selected]
+        if not include_detections:
+            records = [_without_detections(record) for record in records]
+        return records
+
+    def list_page(self, user_id=None, limit=None, after=None, descending=True, include_detections=True):
+        """
+        Return one page of records ordered by (uploaded_at, image_id)
+
+        Args:
+            user_id: Only return records owned by this user (None for all records)
+            limit: Maximum number of records to return (None for no limit)
+            after: (uploaded_at, image_id) of the last record of the previous page
+            descending: Newest first when True, oldest first otherwise
+            include_detections: Whether analysis_results keep their per-box detections
+        """
+        with self._lock:
+            keys = self._order if user_id is None else self._by_user.get(user_id, [])
+            return self._listing(keys, limit, after, descending, include_detections)
+
+    def list_all(self, include_detections=True):
+        """Return copies of every record, newest first"""
+        return self.list_page(include_detections=include_detections)
+
+    def list_for_user(self, user_id, include_detections=True):
+        """Return copies of the records owned by user_id, newest first"""
+        return self.list_page(user_id, include_detections=include_detections)
+
+    def list_by_status(self, status, limit=None, after=None, descending=True, include_detections=True):
+        """Return one page of the records currently in the given status; see list_page"""
+        with self._lock:
+            return self._listing(self._by_status.get(status, []), limit, after, descending, include_detections)
+
+    def list_by_content_hash(self, content_hash):
+        """Return copies of the records whose image bytes have this SHA-256, oldest first"""
+        with self._lock:
+            return self._listing(self._by_hash.get(content_hash, []), descending=False)
+
+    def list_perceptual_hashes(self):
+        """Return (image_id, perceptual_hash) for every record that has one"""
+        with self._lock:
+            return [(image_id, record['perceptual_hash']) for image_id, record in self._images.items()
+                    if record.get('perceptual_hash')]
+
+    def count(self):
+        with self._lock:
+            return len(self._images)
+
+
+class DatabaseImageRepository:
+    """
+    Image repository backed by the images.ImageUpload model
+
+    Exposes the same interface as InMemoryImageRepository and returns plain
+    record dicts. The per-box detections live in their own column and are
+    merged back into analysis_results on read; list queries can defer them.
+    """
+
+    # Record keys that map directly onto model fields
+    FIELDS = (
+        'user_id', 'image_url', 'cloudinary_public_id', 'location', 'latitude', 'longitude',
+        'uploaded_at', 'status', 'processed_image_url', 'error_message', 'image_width',
+        'image_height', 'model_used', 'ml_config', 'task_id', 'content_hash', 'duplicate_of',
+        'perceptual_hash', 'duplicate_distance', 'raw_predictions',
+    )
+
+    @property
+    def model(self):
+        # Imported lazily so this module can be loaded before the app registry
+        from .models import ImageUpload
+        return ImageUpload
+
+    @property
+    def revision_model(self):
+        from .models import ImageStoreRevision
+        return ImageStoreRevision
+
+    def _bump(self, *user_ids):
+        for scope in _revision_scopes(*user_ids):
+            bumped = self.revision_model.objects.filter(scope=scope).update(revision=F('revision') + 1)
+            if not bumped:
+                try:
+                    with transaction.atomic():
+                        self.revision_model.objects.create(scope=scope, revision=1)
+                except IntegrityError:
+                    # Created concurrently by another writer
+                    self.revision_model.objects.filter(scope=scope).update(revision=F('revision') + 1)
+
+    def revision(self, user_id=None):
+        """Return the write counter for user_id's records (or for all records)"""
+        scope = 'all' if user_id is None else f"user:{user_id}"
+        revision = self.revision_model.objects.filter(scope=scope).values_list('revision', flat=True).first()
+        return revision or 0
+
+    def _to_columns(self, fields):
+        columns = {}
+        for key, value in fields.items():
+            if key == 'analysis_results':
+                analysis = dict(value) if value else value
+                columns['detections'] = analysis.pop('detections', None) if analysis else None
+                columns['analysis_results'] = analysis
+            elif key == 'uploaded_at':
+                columns['uploaded_at'] = _parse_uploaded_at(value)
+            elif key in self.FIELDS:
+                columns[key] = value
+            elif key != 'image_id':
+                print(f"WARNING: Ignoring unknown image field '{key}'")
+        return columns
+
+    def _to_record(self, instance):
+        deferred = instance.get_deferred_fields()
+        record = {'image_id': str(instance.pk)}
+        for field in self.FIELDS:
+            if field not in deferred:
+                record[field] = getattr(instance, field)
+        if 'uploaded_at' in record:
+            record['uploaded_at'] = record['uploaded_at'].isoformat()
+        analysis = instance.analysis_results
+        if analysis is not None and 'detections' not in deferred and instance.detections is not None:
+            analysis = dict(analysis, detections=instance.detections)
+        record['analysis_results'] = analysis
+        return record
+
+    def _listing(self, queryset, limit=None, after=None, descending=True, include_detections=True):
+        if after:
+            uploaded_at, image_id = _parse_uploaded_at(after[0]), after[1]
+            if descending:
+                queryset = queryset.filter(Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, pk__lt=image_id))
+            else:
+                queryset = queryset.filter(Q(uploaded_at__gt=uploaded_at) | Q(uploaded_at=uploaded_at, pk__gt=image_id))
+        if not include_detections:
+            queryset = queryset.defer('detections', 'raw_predictions')
+        queryset = queryset.order_by(*(('-uploaded_at', '-pk') if descending else ('uploaded_at', 'pk')))
+        if limit is not None:
+            queryset = queryset[:limit]
+        return [self._to_record(instance) for instance in queryset]
+
+    def add(self, record):
+        """Store a new image record (or replace one with the same image_id)"""
+        record = dict(record)
+        record.setdefault('user_id', '1')
+        previous_user_id = self.model.objects.filter(pk=record['image_id']).values_list('user_id', flat=True).first()
+        instance, _ = self.model.objects.update_or_create(pk=record['image_id'], defaults=self._to_columns(record))
+        self._bump(instance.user_id, *((previous_user_id,) if previous_user_id else ()))
+        return self._to_record(instance)
+
+    def get(self, image_id, user_id=None, include_detections=True):
+        """Return the image record, optionally only if owned by user_id"""
+        try:
+            queryset = self.model.objects.filter(pk=image_id)
+            if user_id is not None:
+                queryset = queryset.filter(user_id=user_id)
+            if not include_detections:
+                queryset = queryset.defer('detections', 'raw_predictions')
+            instance = queryset.first()
+        except (ValueError, ValidationError):
+            # Not a valid UUID, so it cannot match any record
+            return None
+        return self._to_record(instance) if instance is not None else None
+
+    def update(self, image_id, **fields):
+        """Update fields on an image record, returning the updated record or None"""
+        try:
+            previous_user_id = self.model.objects.filter(pk=image_id).values_list('user_id', flat=True).first()
+            updated = self.model.objects.filter(pk=image_id).update(**self._to_columns(fields))
+        except (ValueError, ValidationError):
+            return None
+        if not updated:
+            return None
+        record = self.get(image_id)
+        self._bump(previous_user_id, record['user_id'])
+        return record
+
+    def delete(self, image_id):
+        """Remove an image record, returning the removed record or None"""
+        record = self.get(image_id)
+        if record is not None:
+            self.model.objects.filter(pk=image_id).delete()
+            self._bump(record['user_id'])
+        return record
+
+    def list_page(self, user_id=None, limit=None, after=None, descending=True, include_detections=True):
+        """Return one page of records ordered by (uploaded_at, image_id); see InMemoryImageRepository.list_page"""
+        queryset = self.model.objects.all() if user_id is None else self.model.objects.filter(user_id=user_id)
+        return self._listing(queryset, limit, after, descending, include_detections)
+
+    def list_all(self, include_detections=True):
+        """Return every record, newest first"""
+        return self.list_page(include_detections=include_detections)
+
+    def list_for_user(self, user_id, include_detections=True):
+        """Return the records owned by user_id, newest first"""
+        return self.list_page(user_id, include_detections=include_detections)
+
+    def list_by_status(self, status, limit=None, after=None, descending=True, include_detections=True):
+        """Return one page of the records currently in the given status; see InMemoryImageRepository.list_page"""
+        return self._listing(self.model.objects.filter(status=status), limit, after, descending, include_detections)
+
+    def list_by_content_hash(self, content_hash):
+        """Return the records whose image bytes have this SHA-256, oldest first"""
+        return self._listing(self.model.objects.filter(content_hash=content_hash), descending=False)
+
+    def list_perceptual_hashes(self):
+        """Return (image_id, perceptual_hash) for every record that has one"""
+        rows = self.model.objects.exclude(perceptual_hash__isnull=True).values_list('pk', 'perceptual_hash')
+        return [(str(image_id), perceptual_hash) for image_id, perceptual_hash in rows.iterator()]
+
+    def count(self):
+        return self.model.objects.count()
+
+
+class RedisImageRepository:
+    """
+    Image repository backed by Redis, shared by every web and worker process
+
+    Each record is a hash of JSON-encoded fields, with the per-box detections
+    in a separate key so listings can skip them. Sorted sets scored by upload
+    time index all records, each user's records and each status; listings
+    fetch the ordered IDs and then the hashes in a single pipeline.
+    """
+
+    def __init__(self, url=None, prefix='binsavvy:images'):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url or settings.IMAGE_STORE_REDIS_URL)
+
+    def _key(self, image_id):
+        return f"{self.prefix}:record:{image_id}"
+
+    def _detections_key(self, image_id):
+        return f"{self.prefix}:detections:{image_id}"
+
+    def _all_key(self):
+        return f"{self.prefix}:all"
+
+    def _user_key(self, user_id):
+        return f"{self.prefix}:user:{user_id}"
+
+    def _status_key(self, status):
+        return f"{self.prefix}:status:{status}"
+
+    def _hash_key(self, content_hash):
+        return f"{self.prefix}:hash:{content_hash}"
+
+    def _phash_key(self):
+        return f"{self.prefix}:phashes"
+
+    def _revision_key(self, scope):
+        return f"{self.prefix}:revision:{scope}"
+
+    def _bump(self, pipe, *user_ids):
+        for scope in _revision_scopes(*user_ids):
+            pipe.incr(self._revision_key(scope))
+
+    def revision(self, user_id=None):
+        """Return the write counter for user_id's records (or for all records)"""
+        revision = self._client.get(self._revision_key('all' if user_id is None else f"user:{user_id}"))
+        return int(revision) if revision else 0
+
+    @staticmethod
+    def _score(uploaded_at):
+        return _parse_uploaded_at(uploaded_at).timestamp()
+
+    @staticmethod
+    def _encode(fields):
+        """Split fields into hash values and the detections list (None if unchanged)"""
+        fields = dict(fields)
+        detections = None
+        if 'analysis_results' in fields:
+            analysis = fields['analysis_results']
+            analysis = dict(analysis) if analysis else analysis
+            detections = analysis.pop('detections', None) if analysis else None
+            fields['analysis_results'] = analysis
+            # An empty list clears any previously stored detections
+            detections = detections if detections is not None else []
+        return {key: json.dumps(value) for key, value in fields.items()}, detections
+
+    @staticmethod
+    def _decode(raw, detections=None):
+        record = {key.decode(): json.loads(value) for key, value in raw.items()}
+        analysis = record.get('analysis_results')
+        if analysis is not None and detections:
+            record['analysis_results'] = dict(analysis, detections=json.loads(detections))
+        return record
+
+    def _write_detections(self, pipe, image_id, detections):
+        if detections:
+            pipe.set(self._detections_key(image_id), json.dumps(detections))
+        elif detections is not None:
+            pipe.delete(self._detections_key(image_id))
+
+    def _fetch(self, image_ids, include_detections=True):
+        if not image_ids:
+            return []
+        pipe = self._client.pipeline(transaction=False)
+        for image_id in image_ids:
+            pipe.hgetall(self._key(image_id))
+            if include_detections:
+                pipe.get(self._detections_key(image_id))
+        replies = pipe.execute()
+        step = 2 if include_detections else 1
+        records = []
+        for index in range(0, len(replies), step):
+            raw = replies[index]
+            if raw:
+                record = self._decode(raw, replies[index + 1] if include_detections else None)
+                if not include_detections:
+                    record.pop('raw_predictions', None)
+                records.append(record)
+        return records
+
+    def add(self, record):
+        """Store a new image record (or replace one with the same image_id)"""
+        record = dict(record)
+        record.setdefault('user_id', '1')
+        image_id = record['image_id']
+        existing = self.get(image_id, include_detections=False)
+        values, detections = self._encode(record)
+        score = self._score(record.get('uploaded_at'))
+
+        pipe = self._client.pipeline()
+        if existing is not None:
+            pipe.zrem(self._user_key(existing.get('user_id')), image_id)
+            pipe.zrem(self._status_key(existing.get('status')), image_id)
+            if existing.get('content_hash'):
+                pipe.zrem(self._hash_key(existing['content_hash']), image_id)
+            pipe.delete(self._key(image_id))
+        pipe.hset(self._key(image_id), mapping=values)
+        self._write_detections(pipe, image_id, detections if detections is not None else [])
+        pipe.zadd(self._all_key(), {image_id: score})
+        pipe.zadd(self._user_key(record.get('user_id')), {image_id: score})
+        pipe.zadd(self._status_key(record.get('status')), {image_id: score})
+        if record.get('content_hash'):
+            pipe.zadd(self._hash_key(record['content_hash']), {image_id: score})
+        if record.get('perceptual_hash'):
+            pipe.hset(self._phash_key(), image_id, record['perceptual_hash'])
+        elif existing is not None:
+            pipe.hdel(self._phash_key(), image_id)
+        self._bump(pipe, record.get('user_id'), *((existing.get('user_id'),) if existing else ()))
+        pipe.execute()
+        return record
+
+    def get(self, image_id, user_id=None, include_detections=True):
+        """Return the image record, optionally only if owned by user_id"""
+        records = self._fetch([image_id], include_detections)
+        if not records or (user_id is not None and records[0].get('user_id') != user_id):
+            return None
+        return records[0]
+
+    def update(self, image_id, **fields):
+        """Update fields on an image record, returning the updated record or None"""
+        key = self._key(image_id)
+        values, detections = self._encode(fields)
+
+        def _apply(pipe):
+            current = pipe.hmget(key, 'user_id', 'status', 'uploaded_at', 'content_hash')
+            if current[0] is None:
+                return False
+            user_id, status, uploaded_at, content_hash = (json.loads(value) if value is not None else None for value in current)
+            new_user_id = fields.get('user_id', user_id)
+            new_status = fields.get('status', status)
+            new_content_hash = fields.get('content_hash', content_hash)
+            score = self._score(fields.get('uploaded_at', uploaded_at))
+
+            pipe.multi()
+            if values:
+                pipe.hset(key, mapping=values)
+            self._write_detections(pipe, image_id, detections)
+            pipe.zrem(self._user_key(user_id), image_id)
+            pipe.zrem(self._status_key(status), image_id)
+            pipe.zadd(self._all_key(), {image_id: score})
+            pipe.zadd(self._user_key(new_user_id), {image_id: score})
+            pipe.zadd(self._status_key(new_status), {image_id: score})
+            if content_hash:
+                pipe.zrem(self._hash_key(content_hash), image_id)
+            if new_content_hash:
+                pipe.zadd(self._hash_key(new_content_hash), {image_id: score})
+            if fields.get('perceptual_hash'):
+                pipe.hset(self._phash_key(), image_id, fields['perceptual_hash'])
+            elif 'perceptual_hash' in fields:
+                pipe.hdel(self._phash_key(), image_id)
+            self._bump(pipe, user_id, new_user_id)
+            return True
+
+        if not self._client.transaction(_apply, key, value_from_callable=True):
+            return None
+        return self.get(image_id)
+
+    def delete(self, image_id):
+        """Remove an image record, returning the removed record or None"""
+        record = self.get(image_id)
+        if record is not None:
+            pipe = self._client.pipeline()
+            pipe.delete(self._key(image_id), self._detections_key(image_id))
+            pipe.zrem(self._all_key(), image_id)
+            pipe.zrem(self._user_key(record.get('user_id')), image_id)
+            pipe.zrem(self._status_key(record.get('status')), image_id)
+            if record.get('content_hash'):
+                pipe.zrem(self._hash_key(record['content_hash']), image_id)
+            pipe.hdel(self._phash_key(), image_id)
+            self._bump(pipe, record.get('user_id'))
+            pipe.execute()
+        return record
+
+    def _listing(self, index_key, limit=None, after=None, descending=True, include_detections=True):
+        if after is None:
+            stop = limit - 1 if limit is not None else -1
+            members = self._client.zrevrange(index_key, 0, stop) if descending else self._client.zrange(index_key, 0, stop)
+            image_ids = [member.decode() for member in members]
+        else:
+            # Members sharing the cursor's score sort by ID; over-fetch them and filter
+            score, after_id = self._score(after[0]), after[1]
+            page = {}
+            if limit is not None:
+                page = {'start': 0, 'num': limit + self._client.zcount(index_key, score, score)}
+            if descending:
+                members = self._client.zrevrangebyscore(index_key, score, '-inf', withscores=True, **page)
+                image_ids = [m.decode() for m, s in members if s < score or m.decode() < after_id]
+            else:
+                members = self._client.zrangebyscore(index_key, score, '+inf', withscores=True, **page)
+                image_ids = [m.decode() for m, s in members if s > score or m.decode() > after_id]
+            if limit is not None:
+                image_ids = image_ids[:limit]
+        return self._fetch(image_ids, include_detections)
+
+    def list_page(self, user_id=None, limit=None, after=None, descending=True, include_detections=True):
+        """Return one page of records ordered by (uploaded_at, image_id); see InMemoryImageRepository.list_page"""
+        index_key = self._all_key() if user_id is None else self._user_key(user_id)
+        return self._listing(index_key, limit, after, descending, include_detections)
+
+    def list_all(self, include_detections=True):
+        """Return every record, newest first"""
+        return self.list_page(include_detections=include_detections)
+
+    def list_for_user(self, user_id, include_detections=True):
+        """Return the records owned by user_id, newest first"""
+        return self.list_page(user_id, include_detections=include_detections)
+
+    def list_by_status(self, status, limit=None, after=None, descending=True, include_detections=True):
+        """Return one page of the records currently in the given status; see InMemoryImageRepository.list_page"""
+        return self._listing(self._status_key(status), limit, after, descending, include_detections)
+
+    def list_by_content_hash(self, content_hash):
+        """Return the records whose image bytes have this SHA-256, oldest first"""
+        return self._listing(self._hash_key(content_hash), descending=False)
+
+    def list_perceptual_hashes(self):
+        """Return (image_id, perceptual_hash) for every record that has one"""
+        return [(image_id.decode(), perceptual_hash.decode())
+                for image_id, perceptual_hash in self._client.hgetall(self._phash_key()).items()]
+
+    def count(self):
+        return self._client.zcard(self._all_key())
+
+
+def _without_detections(record):
+    """Return a copy of record without the per-box detections or raw predictions"""
+    analysis = record.get('analysis_results')
+    if analysis and 'detections' in analysis:
+        record = dict(record, analysis_results={k: v for k, v in analysis.items() if k != 'detections'})
+    if 'raw_predictions' in record:
+        record = {k: v for k, v in record.items() if k != 'raw_predictions'}
+    return record
+
+
+IMAGE_STORE_BACKENDS = {
+    'memory': InMemoryImageRepository,
+    'database': DatabaseImageRepository,
+    'redis': RedisImageRepository,
+}
+
+
+def get_image_store():
+    """Create the image repository selected by settings.IMAGE_STORE_BACKEND"""
+    backend = getattr(settings, 'IMAGE_STORE_BACKEND', 'database')
+    if backend not in IMAGE_STORE_BACKENDS:
+        raise ValueError(f"Unknown IMAGE_STORE_BACKEND '{backend}', expected one of {sorted(IMAGE_STORE_BACKENDS)}")
+    return IMAGE_STORE_BACKENDS[backend]()
+
+
+# Process-wide image store
+image_store = get_image_store()
+
+
+def apply_ml_result(image_id, ml_result, ml_config=None):
+    """
+    Write the result of an ML processing run back to the stored image record
+
+    Args:
+        image_id: Unique identifier for the image
+        ml_result: Dictionary returned by ml_service.tasks processing functions
+        ml_config: Optional ML parameters used for the run
+    """
+    if ml_result and ml_result.get('status') == 'completed':
+        fields = {
+            'status': 'completed',
+            'analysis_results': ml_result.get('analysis_results'),
+            'model_used': ml_result.get('model_used'),
+            'error_message': None
+        }
+        # Runs that skip rendering keep the current processed image
+        if 'processed_image_url' in ml_result:
+            fields['processed_image_url'] = ml_result['processed_image_url']
+        # Predictions of the previous run belong to its model and frame; never keep them
+        fields['raw_predictions'] = ml_result.get('raw_predictions')
+        if ml_config is not None:
+            fields['ml_config'] = ml_config
+    else:
+        error_msg = ml_result.get('error', 'Unknown error') if ml_result else 'Processing failed'
+        fields = {
+            'status': 'ml_failed',
+            'error_message': f"ML processing failed: {error_msg}"
+        }
+
+    return image_store.update(image_id, **fields)
+
+
+def collect_task_result(image):
+    """
+    Apply the result of a finished Celery task to a record that is still processing
+
+    Workers run in their own processes and cannot update the records held here, so
+    the web process reads the finished result back from the Celery result backend
+    when the record is requested. Returns the record, updated if the task is done.
+    """
+    task_id = image.get('task_id') if image else None
+    if not task_id or image.get('status') != 'processing':
+        return image
+
+    try:
+        result = AsyncResult(task_id)
+        if not result.ready():
+            return image
+        ml_result = result.result if result.successful() else {'error': str(result.result)}
+    except Exception as e:
+        print(f"Could not read result of task {task_id}: {str(e)}")
+        return image
+
+    return apply_ml_result(image['image_id'], ml_result) or image
@@ -1,3 +1,529 @@
-from django.test import TestCase
+import io
+import random
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import overlay, store as store_module, views
+from .normalize import normalize_image, InvalidImageError
+from .overlay import OverlayCache
+from .phash import BKTree, NearDuplicateIndex, dhash, hamming, near_duplicate_index
+from .store import InMemoryImageRepository, DatabaseImageRepository, RedisImageRepository, image_store
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def jpeg_bytes(width=400, height=300, quality=90):
+    """Smooth two-axis gradient, so perceptual hashes survive resizing and recompression"""
+    gradient = Image.linear_gradient('L')
+    image = Image.merge('RGB', (gradient, gradient.rotate(90), gradient)).resize((width, height))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def upload_file(data, name='photo.jpg'):
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    return buffer
+
+
+def make_record(index, user_id='user-1', uploaded_at=None, **fields):
+    started = datetime(2026, 1, 1, 12, 0, 0)
+    record = {
+        'image_id': str(uuid.UUID(int=index + 1)),
+        'user_id': user_id,
+        'image_url': f'https://cdn.example/{index}.jpg',
+        'location': 'Park',
+        # Pairs of records share a timestamp, so the image_id tie-breaker is exercised
+        'uploaded_at': uploaded_at or (started + timedelta(minutes=index // 2)).isoformat(),
+        'status': 'completed',
+        'analysis_results': {'total_detections': 1, 'detections': [{'x': 1}], 'model_used': 'test'},
+    }
+    record.update(fields)
+    return record
+
+
+class ImageStoreTests(TestCase):
+    """Repository indexes and the list endpoint, run against each store backend"""
+
+    def make_store(self):
+        return InMemoryImageRepository()
+
+    def setUp(self):
+        self.store = self.make_store()
+        for index in range(23):
+            self.store.add(make_record(index, user_id='user-1' if index % 3 else 'user-2'))
+        patcher = mock.patch.object(views, 'image_store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def image_ids(self, records):
+        return [record['image_id'] for record in records]
+
+    def test_indexes_follow_updates_and_deletes(self):
+        moved = make_record(0)['image_id']
+        self.store.update(moved, user_id='user-3')
+        self.assertEqual(self.image_ids(self.store.list_page(user_id='user-3')), [moved])
+        self.assertNotIn(moved, self.image_ids(self.store.list_page(user_id='user-2')))
+        self.store.delete(moved)
+        self.assertEqual(self.store.list_page(user_id='user-3'), [])
+        self.assertEqual(self.store.count(), 22)
+
+    def page_through(self, user_id, sort, limit):
+        seen, cursor = [], None
+        while True:
+            params = {'user_id': user_id, 'sort': sort, 'limit': limit, 'include_detections': 'false'}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/images/list/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['data']), limit)
+            seen.extend(self.image_ids(response.data['data']))
+            cursor = response.data['next_cursor']
+            if not cursor:
+                return seen
+
+    def expected(self, user_id, descending):
+        records = self.store.list_page(user_id=None if user_id == '1' else user_id)
+        keys = sorted(((record['uploaded_at'], record['image_id']) for record in records), reverse=descending)
+        return [image_id for _, image_id in keys]
+
+    def test_cursor_round_trip_both_directions(self):
+        for user_id in ('user-1', 'user-2', '1'):
+            for sort, descending in (('-uploaded_at', True), ('uploaded_at', False)):
+                for limit in (1, 4, 50):
+                    with self.subTest(user_id=user_id, sort=sort, limit=limit):
+                        self.assertEqual(self.page_through(user_id, sort, limit), self.expected(user_id, descending))
+
+    @override_settings(IMAGE_LIST_DEFAULT_LIMIT=10, IMAGE_LIST_MAX_LIMIT=15)
+    def test_pages_by_default_and_caps_limit(self):
+        response = self.client.get('/api/images/list/', {'user_id': '1'})
+        self.assertEqual(len(response.data['data']), 10)
+        self.assertIsNotNone(response.data['next_cursor'])
+
+        response = self.client.get('/api/images/list/', {'user_id': '1', 'limit': 1000})
+        self.assertEqual(len(response.data['data']), 15)
+
+    def test_listing_omits_detections_on_request(self):
+        page = self.store.list_page(user_id='user-1', limit=2, include_detections=False)
+        self.assertTrue(all('detections' not in record['analysis_results'] for record in page))
+
+    def test_status_index_pages_newest_first(self):
+        processing = [make_record(index)['image_id'] for index in (2, 5, 9)]
+        for image_id in processing:
+            self.store.update(image_id, status='processing')
+
+        first = self.store.list_by_status('processing', limit=2)
+        self.assertEqual(self.image_ids(first), processing[:0:-1])
+        last = first[-1]
+        rest = self.store.list_by_status('processing', limit=2, after=(last['uploaded_at'], last['image_id']))
+        self.assertEqual(self.image_ids(rest), processing[:1])
+
+        self.store.update(processing[0], status='completed')
+        self.assertEqual(self.image_ids(self.store.list_by_status('processing')), processing[:0:-1])
+
+    def test_status_filter_is_admin_only(self):
+        failed = make_record(4)['image_id']
+        self.store.update(failed, status='ml_failed')
+
+        response = self.client.get('/api/images/list/', {'user_id': '1', 'status': 'ml_failed'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.image_ids(response.data['data']), [failed])
+
+        response = self.client.get('/api/images/list/', {'user_id': 'user-1', 'status': 'ml_failed'})
+        self.assertEqual(response.status_code, 403)
+
+
+class DatabaseImageStoreTests(ImageStoreTests):
+    def make_store(self):
+        return DatabaseImageRepository()
+
+
+@skipUnless(fakeredis, 'fakeredis is not installed')
+class RedisImageStoreTests(ImageStoreTests):
+    def make_store(self):
+        store = RedisImageRepository(url='redis://localhost:6379/15', prefix=f'test:{uuid.uuid4().hex}')
+        store._client = fakeredis.FakeRedis()
+        return store
+
+
+class ETagTests(TestCase):
+    def setUp(self):
+        self.store = InMemoryImageRepository()
+        self.record = make_record(0)
+        self.store.add(self.record)
+        patcher = mock.patch.object(views, 'image_store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def assert_revalidates(self, path):
+        first = self.client.get(path)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        cached = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], etag)
+
+        # Any write to the user's records changes the ETag
+        self.store.update(self.record['image_id'], location='Beach')
+        changed = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_list(self):
+        self.assert_revalidates('/api/images/list/?user_id=user-1')
+
+    def test_details(self):
+        self.assert_revalidates(f"/api/images/{self.record['image_id']}/?user_id=user-1")
+
+
+class QueuedResultTests(TestCase):
+    """The detail endpoint applies a finished Celery result that the worker could not store here"""
+
+    def setUp(self):
+        self.store = InMemoryImageRepository()
+        self.record = make_record(0, status='processing', task_id='task-1', analysis_results=None)
+        self.store.add(self.record)
+        for module in (views, store_module):
+            patcher = mock.patch.object(module, 'image_store', self.store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.result = mock.Mock()
+        self.result.ready.return_value = False
+        patcher = mock.patch.object(store_module, 'AsyncResult', return_value=self.result)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.path = f"/api/images/{self.record['image_id']}/?user_id=user-1"
+
+    def test_polling_client_sees_the_finished_result(self):
+        pending = self.client.get(self.path)
+        self.assertEqual(pending.data['data']['status'], 'processing')
+
+        self.result.ready.return_value = self.result.successful.return_value = True
+        self.result.result = {'status': 'completed', 'model_used': 'test', 'processed_image_url': 'https://cdn.example/p.jpg',
+                              'analysis_results': {'total_detections': 2, 'model_used': 'test'}}
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=pending['ETag'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['status'], 'completed')
+        self.assertEqual(self.store.get(self.record['image_id'])['analysis_results']['total_detections'], 2)
+
+    def test_failed_task_marks_the_record(self):
+        self.result.ready.return_value, self.result.successful.return_value = True, False
+        self.result.result = RuntimeError('worker lost')
+        response = self.client.get(self.path)
+
+        self.assertEqual(response.data['data']['status'], 'ml_failed')
+        self.assertIn('worker lost', response.data['data']['error_message'])
+
+
+@override_settings(PHASH_DUPLICATE_ACTION='off', PARALLEL_UPLOAD_INFERENCE=False, ML_ASYNC_PROCESSING=False)
+class DuplicateUploadTests(TestCase):
+    """Byte-identical uploads reuse a stored analysis, but never a failed one"""
+
+    def setUp(self):
+        self.client = APIClient()
+        stored = {'url': 'https://cdn.example/new.jpg', 'public_id': 'new', 'width': 400, 'height': 300}
+        for name, value in (('cloudinary_upload_image', mock.Mock(return_value=stored)), ('process_image', mock.Mock())):
+            patcher = mock.patch.object(views, name, value)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def upload(self, data):
+        return self.client.post('/api/images/upload/', {'image': upload_file(data), 'location': 'Park', 'user_id': 'user-1'},
+                                format='multipart')
+
+    def ml_result(self, **analysis):
+        return {'status': 'completed', 'model_used': 'Roboflow Waste Detection v2', 'processed_image_url': 'https://cdn.example/p.jpg',
+                'analysis_results': dict({'total_detections': 0, 'model_used': 'model/1'}, **analysis)}
+
+    def test_failed_analysis_is_not_reused(self):
+        data = jpeg_bytes()
+        self.process_image.return_value = self.ml_result(error='Roboflow unavailable', predictions=[])
+        first = self.upload(data)
+        self.assertIn('error', first.data['analysis_results'])
+
+        self.process_image.return_value = self.ml_result(total_detections=2)
+        second = self.upload(data)
+        self.assertEqual(self.process_image.call_count, 2)
+        self.assertEqual(second.data['analysis_results']['total_detections'], 2)
+        # The stored asset is still shared
+        self.assertEqual(self.cloudinary_upload_image.call_count, 1)
+
+        third = self.upload(data)
+        self.assertEqual(self.process_image.call_count, 2)
+        self.assertEqual(third.data['duplicate_of'], second.data['image_id'])
+        self.assertEqual(third.data['analysis_results']['total_detections'], 2)
+
+    @override_settings(IMAGE_NORMALIZE=True)
+    def test_reused_upload_skips_normalization(self):
+        data = jpeg_bytes()
+        self.process_image.return_value = self.ml_result(total_detections=1)
+        with mock.patch.object(views, 'normalize_image', wraps=normalize_image) as normalize:
+            self.upload(data)
+            second = self.upload(data)
+        self.assertIsNotNone(second.data['duplicate_of'])
+        normalize.assert_called_once()
+
+
+class BKTreeTests(TestCase):
+    def test_search_matches_brute_force(self):
+        rng = random.Random(7)
+        hashes = [rng.getrandbits(64) for _ in range(300)]
+        # Near copies of a few hashes, so small radii have matches
+        hashes += [value ^ (1 << rng.randrange(64)) for value in hashes[:40]]
+        tree = BKTree()
+        for index, value in enumerate(hashes):
+            tree.add(value, index)
+        self.assertEqual(len(tree), len(hashes))
+
+        for query in hashes[:20] + [rng.getrandbits(64) for _ in range(20)]:
+            for radius in (0, 1, 3, 8, 16):
+                expected = sorted((hamming(query, value), index) for index, value in enumerate(hashes)
+                                  if hamming(query, value) <= radius)
+                found = tree.search(query, radius)
+                self.assertEqual(sorted(found), expected)
+                self.assertEqual([distance for distance, _ in found], sorted(distance for distance, _ in found))
+
+    def test_dhash_survives_resize_and_recompression(self):
+        original = int(dhash(jpeg_bytes(800, 600)), 16)
+        copy = int(dhash(jpeg_bytes(380, 285, quality=60)), 16)
+        self.assertLessEqual(hamming(original, copy), 6)
+
+
+class NearDuplicateIndexTests(TestCase):
+    """Lookups never wait for the store scan, and hashes added during a rebuild survive it"""
+
+    def test_rebuild_runs_in_the_background(self):
+        scanning, release = threading.Event(), threading.Event()
+
+        def list_perceptual_hashes():
+            scanning.set()
+            release.wait(5)
+            return [('stored', 'f' * 16)]
+
+        index = NearDuplicateIndex()
+        with mock.patch.object(store_module.image_store, 'list_perceptual_hashes', side_effect=list_perceptual_hashes):
+            # The first lookup starts the rebuild and answers from the (empty) current tree
+            self.assertEqual(index.find('f' * 16, 0), [])
+            self.assertTrue(scanning.wait(5))
+            index.add('uploaded', '0' * 16)
+            self.assertEqual(index.find('0' * 16, 0), [(0, 'uploaded')])
+            release.set()
+
+            for _ in range(100):
+                if index.find('f' * 16, 0):
+                    break
+                time.sleep(0.02)
+
+        self.assertEqual(index.find('f' * 16, 0), [(0, 'stored')])
+        self.assertEqual(index.find('0' * 16, 0), [(0, 'uploaded')])
+
+    @override_settings(PHASH_INDEX_REFRESH_SECONDS=3600)
+    def test_fresh_index_is_not_rescanned(self):
+        index = NearDuplicateIndex()
+        with mock.patch.object(store_module.image_store, 'list_perceptual_hashes', return_value=[]) as scan:
+            index.rebuild()
+            index.add('uploaded', '0' * 16)
+            index.find('0' * 16, 0)
+        scan.assert_called_once()
+
+
+class NearDuplicateOverlayTests(TestCase):
+    """A reused near-duplicate draws the match's boxes scaled to its own image"""
+
+    frame = {'width': 1800, 'height': 1200}
+    box = {'x': 900.0, 'y': 600.0, 'width': 180.0, 'height': 120.0, 'confidence': 0.9, 'class': 'Plastic'}
+
+    def setUp(self):
+        near_duplicate_index.clear()
+        self.addCleanup(near_duplicate_index.clear)
+        overlay.overlay_cache.clear()
+        self.client = APIClient()
+
+        stored = {'url': 'https://cdn.example/new.jpg', 'public_id': 'new', 'width': 400, 'height': 300}
+        patcher = mock.patch.object(views, 'cloudinary_upload_image', return_value=stored)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_match(self, raw_predictions):
+        match = make_record(
+            0, perceptual_hash=dhash(jpeg_bytes(1800, 1200)), model_used='Roboflow Waste Detection v2',
+            analysis_results={'total_detections': 1, 'detections': [self.box], 'model_used': 'model/1'},
+            raw_predictions=raw_predictions
+        )
+        image_store.add(match)
+        near_duplicate_index.rebuild()
+        return match
+
+    def upload(self, **extra):
+        data = {'image': upload_file(jpeg_bytes(380, 285, quality=70)), 'location': 'Park', 'user_id': 'user-1'}
+        data.update(extra)
+        return self.client.post('/api/images/upload/', data, format='multipart')
+
+    @override_settings(PHASH_DUPLICATE_ACTION='reuse', EAGER_PROCESSED_UPLOAD=False)
+    def test_overlay_scales_reused_boxes(self):
+        raw_predictions = {'model_id': 'model/1', 'floor': 0.05, 'image': self.frame,
+                           'classes': ['Plastic'], 'boxes': [[900.0, 600.0, 180.0, 120.0, 0.9, 0]]}
+        match = self.add_match(raw_predictions)
+
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['duplicate_of'], match['image_id'])
+        self.assertEqual(image_store.get(response.data['image_id'])['raw_predictions'], raw_predictions)
+
+        stored_image = mock.Mock(content=jpeg_bytes(400, 300))
+        with mock.patch.object(overlay, 'http_client') as http_client, \
+                mock.patch('ml_service.renderer.draw_detections', side_effect=lambda image, predictions, threshold: image) as draw:
+            http_client.get.return_value = stored_image
+            overlay_response = self.client.get(response.data['processed_image_url'])
+
+        self.assertEqual(overlay_response.status_code, 200)
+        drawn = draw.call_args[0][1]
+        self.assertAlmostEqual(drawn[0]['x'], 900 * 400 / 1800)
+        self.assertAlmostEqual(drawn[0]['y'], 600 * 300 / 1200)
+        self.assertAlmostEqual(drawn[0]['width'], 180 * 400 / 1800)
+
+    @override_settings(PHASH_DUPLICATE_ACTION='reuse')
+    def test_match_without_frame_size_is_only_flagged(self):
+        match = self.add_match(raw_predictions=None)
+
+        response = self.upload(skip_ml='true')
+        self.assertEqual(response.status_code, 201)
+        record = image_store.get(response.data['image_id'])
+        self.assertEqual(record['duplicate_of'], match['image_id'])
+        self.assertEqual(record['analysis_results']['model_used'], views.NO_ML_MODEL)
+
+
+class OverlayFrameTests(TestCase):
+    """Overlays scale each record's boxes from the frame its own run saw"""
+
+    roboflow_predictions = {'model_id': 'model/1', 'floor': 0.05, 'image': {'width': 1800, 'height': 1200},
+                            'classes': ['Plastic'], 'boxes': [[900.0, 600.0, 180.0, 120.0, 0.9, 0]]}
+    yolo_predictions = {'model_id': 'yolov8n-seg', 'floor': 0.05, 'image': {'width': 800, 'height': 600},
+                        'classes': ['Garbage'], 'boxes': [[400.0, 300.0, 80.0, 60.0, 0.8, 0]]}
+
+    def setUp(self):
+        overlay.overlay_cache.clear()
+        self.client = APIClient()
+
+    def drawn_boxes(self, record):
+        with mock.patch.object(overlay, 'http_client') as http_client, \
+                mock.patch('ml_service.renderer.draw_detections', side_effect=lambda image, predictions, threshold: image) as draw:
+            http_client.get.return_value = mock.Mock(content=jpeg_bytes(400, 300))
+            overlay.render_overlay(record, 'JPEG', 80)
+        return draw.call_args[0][1]
+
+    def test_yolo_boxes_are_scaled_to_stored_image(self):
+        box = {'x': 400.0, 'y': 300.0, 'width': 80.0, 'height': 60.0, 'confidence': 0.8, 'class': 'Garbage'}
+        record = make_record(0, analysis_results={'total_detections': 1, 'detections': [box]},
+                             raw_predictions=self.yolo_predictions)
+        drawn = self.drawn_boxes(record)
+        self.assertAlmostEqual(drawn[0]['x'], 200)
+        self.assertAlmostEqual(drawn[0]['width'], 40)
+
+    def test_legacy_bbox_boxes_use_uploaded_size(self):
+        # A stale frame from another model must not apply to corner boxes
+        record = make_record(0, image_width=800, image_height=600, raw_predictions=self.roboflow_predictions,
+                             analysis_results={'total_detections': 1, 'detections': [
+                                 {'bbox': [360.0, 270.0, 440.0, 330.0], 'confidence': 0.8, 'class': 0}]})
+        drawn = self.drawn_boxes(record)
+        self.assertAlmostEqual(drawn[0]['x'], 200)
+        self.assertAlmostEqual(drawn[0]['y'], 150)
+        self.assertAlmostEqual(drawn[0]['height'], 30)
+
+    def reprocess_with_yolo(self, ml_result):
+        record = make_record(0, model_used='Roboflow Waste Detection v2', raw_predictions=self.roboflow_predictions)
+        image_store.add(record)
+        self.addCleanup(image_store.delete, record['image_id'])
+        with mock.patch.object(views, 'ML_AVAILABLE', True), \
+                mock.patch.object(views, 'process_image', create=True, return_value=ml_result):
+            response = self.client.post(f"/api/images/{record['image_id']}/reprocess/", {'backend': 'yolo'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return image_store.get(record['image_id'])
+
+    def test_reprocess_replaces_previous_frame(self):
+        ml_result = {'status': 'completed', 'model_used': 'YOLOv8 Local Model', 'raw_predictions': self.yolo_predictions,
+                     'analysis_results': {'total_detections': 1, 'detections': []}}
+        self.assertEqual(self.reprocess_with_yolo(ml_result)['raw_predictions'], self.yolo_predictions)
+
+    def test_reprocess_without_predictions_clears_previous_frame(self):
+        ml_result = {'status': 'completed', 'model_used': 'YOLOv8 Local Model',
+                     'analysis_results': {'total_detections': 0, 'detections': []}}
+        self.assertIsNone(self.reprocess_with_yolo(ml_result)['raw_predictions'])
+
+    def test_applied_result_without_predictions_clears_previous_frame(self):
+        record = make_record(0, raw_predictions=self.roboflow_predictions)
+        image_store.add(record)
+        self.addCleanup(image_store.delete, record['image_id'])
+        store_module.apply_ml_result(record['image_id'], {'status': 'completed', 'analysis_results': {'total_detections': 0}})
+        self.assertIsNone(image_store.get(record['image_id'])['raw_predictions'])
+
+
+class OverlayCacheTests(TestCase):
+    def test_memory_tier_is_bounded_by_bytes(self):
+        cache = OverlayCache(max_bytes=25, directory='', max_disk_bytes=0)
+        cache.set('a', b'a' * 10)
+        cache.set('b', b'b' * 10)
+        cache.get('a')
+        cache.set('c', b'c' * 10)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'a' * 10)
+        self.assertEqual(cache.stats()['memory_bytes'], 20)
+
+    def test_disk_tier_is_shared_and_bounded(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = OverlayCache(max_bytes=10, directory=directory, max_disk_bytes=25)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key.encode() * 10)
+        self.assertIsNone(cache.get('a'))
+
+        # Another process sees the files left on disk
+        other = OverlayCache(max_bytes=100, directory=directory, max_disk_bytes=25)
+        self.assertEqual(other.get('b'), b'b' * 10)
+        self.assertEqual(other.stats()['disk_hits'], 1)
+
+
+class NormalizeTests(TestCase):
+    def test_rejects_non_images(self):
+        with self.assertRaises(InvalidImageError):
+            normalize_image(b'%PDF-1.7 not an image')
+
+    def test_caps_long_edge_and_applies_orientation(self):
+        image = Image.new('RGB', (3000, 1000), 'red')
+        exif = image.getexif()
+        exif[0x0112] = 6  # rotate 90 degrees clockwise to display
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+
+        data, info = normalize_image(buffer.getvalue(), max_edge=1200)
+        with Image.open(io.BytesIO(data)) as normalized:
+            self.assertEqual(normalized.format, 'JPEG')
+            self.assertEqual(normalized.size, (400, 1200))
+            self.assertNotIn(0x0112, normalized.getexif())
+        self.assertEqual((info['original_width'], info['original_height']), (3000, 1000))
+
+    def test_flattens_transparency(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (10, 10), (0, 0, 0, 0)).save(buffer, 'PNG')
+        data, info = normalize_image(buffer.getvalue())
+        self.assertEqual(info['source_format'], 'PNG')
+        with Image.open(io.BytesIO(data)) as normalized:
+            self.assertEqual(normalized.getpixel((5, 5)), (255, 255, 255))
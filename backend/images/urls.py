@@ -8,4 +8,6 @@ urlpatterns = [
     path('<str:image_id>/', views.get_image_details, name='get_image_details'),
     path('<str:image_id>/delete/', views.delete_image, name='delete_image'),
     path('<str:image_id>/reprocess/', views.reprocess_image, name='reprocess_image'),
+    path('<str:image_id>/threshold-sweep/', views.get_threshold_sweep, name='get_threshold_sweep'),
+    path('<str:image_id>/overlay/', views.get_image_overlay, name='get_image_overlay'),
 ] 
\ No newline at end of file
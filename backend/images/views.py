@@ -1,22 +1,35 @@
 import os
 import json
 import uuid
+import io
 import base64
+import binascii
+import hashlib
 import traceback
 from datetime import datetime
-from django.http import JsonResponse
+from concurrent.futures import ThreadPoolExecutor
+from django.http import JsonResponse, HttpResponse
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 import cloudinary
 import cloudinary.uploader
 from cloudinary_config import upload_image as cloudinary_upload_image, delete_image as cloudinary_delete_image
+from .store import image_store, collect_task_result
+from .phash import dhash, near_duplicate_index
+from .normalize import normalize_image, sniff_format, InvalidImageError, SNIFF_BYTES
+from .overlay import overlay_cache, overlay_version, render_overlay, OverlayRenderer, CONTENT_TYPES as OVERLAY_CONTENT_TYPES
+from ml_service.predictions import threshold_sweep, processing_parameters
 
 # Import ML tasks with error handling
 try:
-    from ml_service.tasks import process_image
+    from ml_service.tasks import process_image, process_image_with_roboflow, process_image_with_yolo, process_image_with_onnx
     ML_AVAILABLE = True
     print("DEBUG: ML tasks imported successfully")
 except Exception as e:
@@ -26,18 +39,6 @@ except Exception as e:
     traceback.print_exc()
     ML_AVAILABLE = False
 
-# In-memory storage for demo (in production, this would be a database)
-uploaded_images = []
-
-# Migration function to add user_id to existing images (for backward compatibility)
-def migrate_existing_images():
-    """Add user_id to existing images that don't have it"""
-    for img in uploaded_images:
-        if 'user_id' not in img:
-            # Assign to admin user (user_id: '1') for existing images
-            img['user_id'] = '1'
-            print(f"Migrated image {img['image_id']} to admin user")
-
 # Helper function to get user ID from request
 def get_user_id_from_request(request):
     """Extract user ID from request headers or query params"""
@@ -54,6 +55,128 @@ def get_user_id_from_request(request):
     # Fallback to query parameter
     return request.GET.get('user_id') or request.data.get('user_id')
 
+# Demo admin accounts (users/views.py), which see every user's images
+ADMIN_USER_IDS = ('1', 'admin')
+
+def is_admin_request(request):
+    """Whether the request comes from one of the admin accounts"""
+    return get_user_id_from_request(request) in ADMIN_USER_IDS
+
+# model_used recorded in analysis_results when an upload skipped ML processing
+NO_ML_MODEL = 'No ML processing'
+
+# Detector backends selectable with the `backend` parameter (default follows use_roboflow)
+ML_BACKENDS = ('roboflow', 'yolo', 'onnx')
+
+def has_ml_analysis(image):
+    """Whether a record holds a finished ML analysis that identical uploads can reuse"""
+    analysis = image.get('analysis_results') or {}
+    # Errors reported inside the analysis (e.g. a failed Roboflow call) are retried, as in the inference cache
+    return image.get('status') == 'completed' and analysis.get('model_used') != NO_ML_MODEL and 'error' not in analysis
+
+# Sort options for the image list, mapped to whether they are descending
+IMAGE_LIST_SORTS = {
+    '-uploaded_at': True,
+    'uploaded_at': False,
+}
+
+def encode_cursor(image):
+    """Build an opaque list cursor from the last record of a page"""
+    payload = json.dumps([image['uploaded_at'], image['image_id']])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor):
+    """Return the (uploaded_at, image_id) pair in a list cursor, raising ValueError if malformed"""
+    try:
+        uploaded_at, image_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        datetime.fromisoformat(uploaded_at)
+        uuid.UUID(image_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return uploaded_at, image_id
+
+# Fields that can be requested with ?fields=; total_detections and waste_types
+# are lifted out of analysis_results
+IMAGE_FIELDS = (
+    'image_id', 'user_id', 'image_url', 'cloudinary_public_id', 'location', 'latitude',
+    'longitude', 'uploaded_at', 'status', 'processed_image_url', 'analysis_results',
+    'error_message', 'image_width', 'image_height', 'model_used', 'ml_config', 'task_id',
+    'content_hash', 'duplicate_of', 'perceptual_hash', 'duplicate_distance', 'raw_predictions',
+    'total_detections', 'waste_types',
+)
+
+# Compact projection for galleries and history lists
+SUMMARY_FIELDS = ('image_id', 'image_url', 'processed_image_url', 'status', 'total_detections', 'waste_types')
+
+def get_projection(request):
+    """
+    Return the fields requested via ?fields= or ?view=summary|full
+
+    Returns None for the full record. Raises ValueError for unknown fields or views.
+    """
+    fields = request.GET.get('fields')
+    if fields:
+        fields = tuple(field.strip() for field in fields.split(',') if field.strip())
+        unknown = [field for field in fields if field not in IMAGE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+    
+    view = request.GET.get('view', 'full')
+    if view == 'summary':
+        return SUMMARY_FIELDS
+    if view != 'full':
+        raise ValueError('view must be summary or full')
+    return None
+
+def project_image(image, fields):
+    """Return only the requested fields of an image record"""
+    if fields is None:
+        return image
+    analysis = image.get('analysis_results') or {}
+    projected = {}
+    for field in fields:
+        if field == 'total_detections':
+            projected[field] = analysis.get('total_detections', 0)
+        elif field == 'waste_types':
+            projected[field] = analysis.get('waste_types', {})
+        else:
+            projected[field] = image.get(field)
+    return projected
+
+def revision_etag(request, revision, user_id):
+    """Build a weak ETag from a store revision counter and the request's path and query"""
+    digest = hashlib.sha1(f"{user_id}|{request.get_full_path()}".encode()).hexdigest()[:16]
+    return f'W/"{revision}-{digest}"'
+
+def etag_matches(request, etag):
+    """Check the request's If-None-Match header against etag (weak comparison)"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == opaque for tag in header.split(','))
+
+def with_etag(response, etag):
+    """Attach the ETag and ask clients to revalidate before reusing the response"""
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def with_overlay_url(request, image):
+    """
+    Point processed_image_url at the on-demand overlay when no processed image was uploaded
+    
+    The URL carries the detections version, so it changes whenever a reprocess
+    changes the detections and the overlay itself can be cached for good.
+    """
+    if image.get('processed_image_url') or not has_ml_analysis(image):
+        return image
+    url = request.build_absolute_uri(reverse('get_image_overlay', args=[image['image_id']]))
+    return dict(image, processed_image_url=f"{url}?v={overlay_version(image)}")
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def health_check(request):
@@ -75,13 +198,18 @@ def upload_image(request):
         latitude = request.data.get('latitude')
         longitude = request.data.get('longitude')
         use_roboflow = request.data.get('use_roboflow', 'true').lower() == 'true'
+        backend = request.data.get('backend') or ('roboflow' if use_roboflow else 'yolo')
         skip_ml = request.data.get('skip_ml', 'false').lower() == 'true'
+        async_ml = str(request.data.get('async_ml', settings.ML_ASYNC_PROCESSING)).lower() == 'true'
         
         # Get user ID from request
         user_id = get_user_id_from_request(request)
         if not user_id:
             return Response({'error': 'User ID is required'}, status=status.HTTP_400_BAD_REQUEST)
         
+        if backend not in ML_BACKENDS:
+            return Response({'error': f"backend must be one of {', '.join(ML_BACKENDS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        
         if not image_file:
             return Response({'error': 'No image file provided'}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -89,12 +217,126 @@ def upload_image(request):
             return Response({'error': 'Location is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         image_id = str(uuid.uuid4())
-        current_time = datetime.now().isoformat()
+        current_time = timezone.now().isoformat()
         
         print(f"Starting upload for image {image_id} with location: {location}")
         
-        # Upload to Cloudinary
-        cloudinary_result = cloudinary_upload_image(image_file, folder="binsavvy/uploads")
+        # Read the upload once, hashing it as it streams in; the same buffer feeds storage, inference and rendering
+        hasher = hashlib.sha256()
+        chunks = []
+        for chunk in image_file.chunks():
+            # Reject non-images on the first chunk, before reading the rest
+            if not chunks and sniff_format(chunk[:SNIFF_BYTES]) is None:
+                return Response({'error': 'File is not a supported image (JPEG, PNG, WebP, GIF, BMP or TIFF)'}, status=status.HTTP_400_BAD_REQUEST)
+            hasher.update(chunk)
+            chunks.append(chunk)
+        image_bytes = b''.join(chunks)
+        # Hash of the upload as received, so resubmitting the same file still matches
+        content_hash = hasher.hexdigest()
+        
+        # Resubmitted photo: link the new report to the stored asset and, once available, its analysis
+        duplicates = image_store.list_by_content_hash(content_hash)
+        original = next((img for img in duplicates if has_ml_analysis(img)), duplicates[0] if duplicates else None)
+        
+        if original is not None and has_ml_analysis(original):
+            image_object = {
+                'image_id': image_id,
+                'user_id': user_id,
+                'image_url': original['image_url'],
+                'cloudinary_public_id': original.get('cloudinary_public_id'),
+                'location': location,
+                'latitude': float(latitude) if latitude else None,
+                'longitude': float(longitude) if longitude else None,
+                'uploaded_at': current_time,
+                'status': 'completed',
+                'processed_image_url': original.get('processed_image_url'),
+                'analysis_results': original.get('analysis_results'),
+                'error_message': None,
+                'image_width': original.get('image_width'),
+                'image_height': original.get('image_height'),
+                'model_used': original.get('model_used'),
+                'content_hash': content_hash,
+                'duplicate_of': original['image_id'],
+                'perceptual_hash': original.get('perceptual_hash'),
+                'duplicate_distance': 0,
+                'raw_predictions': original.get('raw_predictions')
+            }
+            image_store.add(image_object)
+            
+            print(f"Image {image_id} duplicates {original['image_id']}, reusing stored asset and analysis")
+            
+            return Response({
+                'message': 'Image uploaded successfully, reused analysis of an identical image',
+                'image_id': image_id,
+                'image_url': image_object['image_url'],
+                'status': 'completed',
+                'processed_image_url': with_overlay_url(request, image_object)['processed_image_url'],
+                'analysis_results': image_object['analysis_results'],
+                'duplicate_of': original['image_id']
+            }, status=status.HTTP_201_CREATED)
+        
+        # Downscale, orient and strip metadata once; Cloudinary and the detector get the smaller JPEG.
+        # Runs after the content-hash lookup, so resubmitted photos with a stored analysis skip it
+        if settings.IMAGE_NORMALIZE:
+            try:
+                image_bytes, normalized = normalize_image(image_bytes)
+            except InvalidImageError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            print(f"Normalized image {image_id}: {normalized['source_format']} {normalized['original_width']}x{normalized['original_height']} "
+                  f"({normalized['original_bytes']} bytes) -> JPEG {normalized['width']}x{normalized['height']} ({normalized['bytes']} bytes)")
+        
+        # Near-identical shot (recompressed, resized, slightly cropped): find the closest analysed record
+        perceptual_hash = original.get('perceptual_hash') if original else None
+        near_match, near_distance = None, None
+        if settings.PHASH_DUPLICATE_ACTION != 'off':
+            try:
+                perceptual_hash = perceptual_hash or dhash(image_bytes)
+            except Exception as hash_error:
+                print(f"Could not compute perceptual hash for image {image_id}: {str(hash_error)}")
+            if perceptual_hash and original is None:
+                for distance, match_id in near_duplicate_index.find(perceptual_hash, settings.PHASH_DUPLICATE_RADIUS):
+                    match = image_store.get(match_id)
+                    if match is not None and has_ml_analysis(match):
+                        near_match, near_distance = match, distance
+                        break
+        
+        # Boxes can only be carried over when the match recorded the frame they were found in,
+        # so overlays of the new image rescale them to its own size; otherwise the match is only flagged
+        reuse_near_match = near_match is not None and settings.PHASH_DUPLICATE_ACTION == 'reuse' \
+            and bool((near_match.get('raw_predictions') or {}).get('image'))
+        
+        # Inline inference reads the bytes already in memory, so it need not wait for the stored URL
+        infer_alongside_upload = (settings.PARALLEL_UPLOAD_INFERENCE and ML_AVAILABLE and original is None
+                                  and not (skip_ml or async_ml or reuse_near_match))
+        ml_result = None
+        
+        if original is not None:
+            # Identical bytes are already stored but not analysed yet; skip the storage upload only
+            cloudinary_result = {
+                'url': original['image_url'],
+                'public_id': original.get('cloudinary_public_id'),
+                'width': original.get('image_width'),
+                'height': original.get('image_height')
+            }
+        elif infer_alongside_upload:
+            # Upload to Cloudinary on a worker thread while this one runs inference;
+            # the record is assembled once both are done
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                upload = pool.submit(cloudinary_upload_image, io.BytesIO(image_bytes), folder="binsavvy/uploads")
+                print(f"Starting ML processing for image {image_id} alongside the Cloudinary upload")
+                ml_result = process_image(
+                    image_id=image_id,
+                    image_url=None,
+                    location=location,
+                    use_roboflow=use_roboflow,
+                    image_bytes=image_bytes,
+                    content_hash=content_hash,
+                    backend=backend
+                )
+                cloudinary_result = upload.result()
+        else:
+            # Upload to Cloudinary
+            cloudinary_result = cloudinary_upload_image(io.BytesIO(image_bytes), folder="binsavvy/uploads")
         
         if not cloudinary_result:
             return Response({
@@ -116,28 +358,59 @@ def upload_image(request):
             'analysis_results': None,
             'error_message': None,
             'image_width': cloudinary_result.get('width'),
-            'image_height': cloudinary_result.get('height')
+            'image_height': cloudinary_result.get('height'),
+            'content_hash': content_hash,
+            'perceptual_hash': perceptual_hash,
+            'duplicate_of': None,
+            'duplicate_distance': None
         }
+        if original is not None:
+            image_object.update(duplicate_of=original['image_id'], duplicate_distance=0)
+        elif near_match is not None:
+            image_object.update(duplicate_of=near_match['image_id'], duplicate_distance=near_distance)
         
-        # Store the image temporarily
-        uploaded_images.append(image_object)
+        # Store the image record
+        image_store.add(image_object)
+        if perceptual_hash:
+            near_duplicate_index.add(image_id, perceptual_hash)
         
         print(f"Image uploaded to Cloudinary: {cloudinary_result['url']}")
         
+        # Near-duplicate of an analysed shot: reuse its analysis instead of running inference
+        if reuse_near_match:
+            image_object.update(
+                status='completed',
+                processed_image_url=near_match.get('processed_image_url'),
+                analysis_results=near_match.get('analysis_results'),
+                model_used=near_match.get('model_used'),
+                raw_predictions=near_match.get('raw_predictions')
+            )
+            image_store.add(image_object)
+            
+            print(f"Image {image_id} is a near duplicate of {near_match['image_id']} (distance {near_distance}), reusing analysis")
+            
+            return Response({
+                'message': 'Image uploaded successfully, reused analysis of a near-identical image',
+                'image_id': image_id,
+                'image_url': cloudinary_result['url'],
+                'status': 'completed',
+                'processed_image_url': with_overlay_url(request, image_object)['processed_image_url'],
+                'analysis_results': image_object['analysis_results'],
+                'duplicate_of': near_match['image_id'],
+                'duplicate_distance': near_distance
+            }, status=status.HTTP_201_CREATED)
+        
         # If skip_ml is True, just store the image without ML processing
         if skip_ml:
             image_object['status'] = 'completed'
             image_object['analysis_results'] = {
                 'message': 'ML processing skipped',
                 'total_detections': 0,
-                'model_used': 'No ML processing'
+                'model_used': NO_ML_MODEL
             }
             
             # Update stored image
-            for i, img in enumerate(uploaded_images):
-                if img['image_id'] == image_id:
-                    uploaded_images[i] = image_object
-                    break
+            image_store.add(image_object)
             
             print(f"Image {image_id} uploaded without ML processing")
             
@@ -149,29 +422,61 @@ def upload_image(request):
                 'analysis_results': image_object['analysis_results']
             }, status=status.HTTP_201_CREATED)
         
-        # Process with ML if available
-        if ML_AVAILABLE:
+        # Hand ML work to Celery and return right away; the task writes results back to the store
+        if ML_AVAILABLE and async_ml:
             try:
-                print(f"Starting ML processing for image {image_id}")
-                
-                # Process image with ML
-                ml_result = process_image(
+                ml_task = {
+                    'roboflow': process_image_with_roboflow,
+                    'yolo': process_image_with_yolo,
+                    'onnx': process_image_with_onnx
+                }[backend]
+                task = ml_task.delay(
                     image_id=image_id,
                     image_url=cloudinary_result['url'],
-                    location=location,
-                    use_roboflow=use_roboflow
+                    location=location
                 )
+                image_store.update(image_id, task_id=task.id)
+                
+                print(f"Queued ML processing for image {image_id} as task {task.id}")
+                
+                return Response({
+                    'message': 'Image uploaded, ML processing queued',
+                    'image_id': image_id,
+                    'image_url': cloudinary_result['url'],
+                    'status': 'processing',
+                    'task_id': task.id,
+                    'status_url': request.build_absolute_uri(reverse('get_image_details', args=[image_id]))
+                }, status=status.HTTP_202_ACCEPTED)
+                
+            except Exception as queue_error:
+                # Broker unavailable - fall back to inline processing below
+                print(f"Failed to queue ML task for image {image_id}, processing inline: {str(queue_error)}")
+        
+        # Process with ML if available
+        if ML_AVAILABLE:
+            try:
+                if ml_result is None:
+                    print(f"Starting ML processing for image {image_id}")
+                    
+                    # Process image with ML
+                    ml_result = process_image(
+                        image_id=image_id,
+                        image_url=cloudinary_result['url'],
+                        location=location,
+                        use_roboflow=use_roboflow,
+                        image_bytes=image_bytes,
+                        content_hash=content_hash,
+                        backend=backend
+                    )
                 
                 # Update image object with ML results
                 image_object['status'] = 'completed'
                 image_object['processed_image_url'] = ml_result.get('processed_image_url')
                 image_object['analysis_results'] = ml_result.get('analysis_results')
+                image_object['raw_predictions'] = ml_result.get('raw_predictions')
                 
                 # Update stored image
-                for i, img in enumerate(uploaded_images):
-                    if img['image_id'] == image_id:
-                        uploaded_images[i] = image_object
-                        break
+                image_store.add(image_object)
                 
                 print(f"ML processing completed for image {image_id}")
                 
@@ -180,7 +485,7 @@ def upload_image(request):
                     'image_id': image_id,
                     'image_url': cloudinary_result['url'],
                     'status': 'completed',
-                    'processed_image_url': ml_result.get('processed_image_url'),
+                    'processed_image_url': with_overlay_url(request, image_object)['processed_image_url'],
                     'analysis_results': ml_result.get('analysis_results')
                 }, status=status.HTTP_201_CREATED)
                 
@@ -193,10 +498,7 @@ def upload_image(request):
                 image_object['error_message'] = f"ML processing failed: {str(ml_error)}"
                 
                 # Update stored image
-                for i, img in enumerate(uploaded_images):
-                    if img['image_id'] == image_id:
-                        uploaded_images[i] = image_object
-                        break
+                image_store.add(image_object)
                 
                 return Response({
                     'message': 'Image uploaded but ML processing failed',
@@ -215,10 +517,7 @@ def upload_image(request):
             }
             
             # Update stored image
-            for i, img in enumerate(uploaded_images):
-                if img['image_id'] == image_id:
-                    uploaded_images[i] = image_object
-                    break
+            image_store.add(image_object)
             
             print(f"Image {image_id} uploaded but ML not available")
             
@@ -248,26 +547,68 @@ def get_user_images(request):
         if not user_id:
             return Response({'error': 'User ID is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Migrate existing images to add user_id
-        migrate_existing_images()
-        
         # Check if this is an admin user (user_id '1' or 'admin')
-        is_admin = user_id in ['1', 'admin']
-        
-        if is_admin:
-            # Admin can see all images
-            user_images = uploaded_images
-            print(f"Admin user {user_id} - returning all {len(user_images)} images")
-            print(f"DEBUG: All uploaded images: {[img.get('image_id', 'no-id') for img in uploaded_images]}")
+        is_admin = user_id in ADMIN_USER_IDS
+        
+        try:
+            fields = get_projection(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Per-box detections are only loaded when the projection needs them
+        include_detections = request.GET.get('include_detections', 'true').lower() == 'true'
+        include_detections = include_detections and (fields is None or 'analysis_results' in fields)
+        
+        # Page size, capped so payloads stay bounded however large the corpus grows
+        try:
+            limit = int(request.GET.get('limit', settings.IMAGE_LIST_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.IMAGE_LIST_MAX_LIMIT))
+        
+        sort = request.GET.get('sort', '-uploaded_at')
+        if sort not in IMAGE_LIST_SORTS:
+            return Response({'error': f'sort must be one of {", ".join(IMAGE_LIST_SORTS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        cursor = request.GET.get('cursor')
+        try:
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Status filtering reads the store's status index across every user, so it is admin-only
+        status_filter = request.GET.get('status')
+        if status_filter and not is_admin:
+            return Response({'error': 'Only admins can filter images by status'}, status=status.HTTP_403_FORBIDDEN)
+        
+        # Read the revision before the data so a concurrent write can only make the ETag stale, never the payload
+        etag = revision_etag(request, image_store.revision(None if is_admin else user_id), user_id)
+        if etag_matches(request, etag):
+            return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        
+        # Admin can see all images, regular users only see their own
+        # Fetch one extra record to find out whether another page follows
+        page = {
+            'limit': limit + 1,
+            'after': after,
+            'descending': IMAGE_LIST_SORTS[sort],
+            'include_detections': include_detections
+        }
+        if status_filter:
+            user_images = image_store.list_by_status(status_filter, **page)
         else:
-            # Regular users only see their own images
-            user_images = [img for img in uploaded_images if img.get('user_id') == user_id]
-            print(f"Regular user {user_id} - returning {len(user_images)} images")
-        
-        return Response({
+            user_images = image_store.list_page(user_id=None if is_admin else user_id, **page)
+        next_cursor = None
+        if len(user_images) > limit:
+            next_cursor = encode_cursor(user_images[limit - 1])
+            user_images = user_images[:limit]
+        print(f"{'Admin' if is_admin else 'Regular'} user {user_id} - returning {len(user_images)} images")
+        
+        return with_etag(Response({
             'message': 'Images retrieved successfully',
-            'data': user_images
-        })
+            'data': [project_image(with_overlay_url(request, image), fields) for image in user_images],
+            'next_cursor': next_cursor
+        }), etag)
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -283,16 +624,33 @@ def get_image_details(request, image_id):
         if not user_id:
             return Response({'error': 'User ID is required'}, status=status.HTTP_400_BAD_REQUEST)
         
+        try:
+            fields = get_projection(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Queued ML runs finish in a worker process, so pick up their result before
+        # the revision is read; otherwise a polling client would keep getting 304s
+        collect_task_result(image_store.get(image_id, user_id=user_id, include_detections=False))
+        
+        etag = revision_etag(request, image_store.revision(user_id), user_id)
+        if etag_matches(request, etag):
+            return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        
         # Find the image by ID and check ownership
-        image = next((img for img in uploaded_images if img['image_id'] == image_id and img.get('user_id') == user_id), None)
+        image = image_store.get(
+            image_id,
+            user_id=user_id,
+            include_detections=fields is None or 'analysis_results' in fields
+        )
         
         if not image:
             return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        return Response({
+        return with_etag(Response({
             'message': 'Image details retrieved successfully',
-            'data': image
-        })
+            'data': project_image(with_overlay_url(request, image), fields)
+        }), etag)
         
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -302,8 +660,6 @@ def get_image_details(request, image_id):
 def delete_image(request, image_id):
     """Delete image from storage and Cloudinary"""
     try:
-        global uploaded_images
-        
         # Get user ID from request
         user_id = get_user_id_from_request(request)
         
@@ -311,13 +667,20 @@ def delete_image(request, image_id):
             return Response({'error': 'User ID is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Find the image before deleting and check ownership
-        image_to_delete = next((img for img in uploaded_images if img['image_id'] == image_id and img.get('user_id') == user_id), None)
+        image_to_delete = image_store.get(image_id, user_id=user_id)
         
         if not image_to_delete:
             return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
         
+        # Reports of identical photos share one Cloudinary asset; keep it while others still link to it
+        public_id = image_to_delete.get('cloudinary_public_id')
+        asset_shared = bool(image_to_delete.get('content_hash')) and any(
+            img['image_id'] != image_id and img.get('cloudinary_public_id') == public_id
+            for img in image_store.list_by_content_hash(image_to_delete['content_hash'])
+        )
+        
         # Delete from Cloudinary if public_id exists
-        if image_to_delete.get('cloudinary_public_id'):
+        if public_id and not asset_shared:
             try:
                 delete_success = cloudinary_delete_image(image_to_delete['cloudinary_public_id'])
                 if delete_success:
@@ -328,7 +691,7 @@ def delete_image(request, image_id):
                 print(f"Error deleting from Cloudinary: {cloudinary_error}")
         
         # Remove from local storage
-        uploaded_images = [img for img in uploaded_images if img['image_id'] != image_id]
+        image_store.delete(image_id)
         
         return Response({
             'message': f'Image {image_id} deleted successfully'
@@ -343,24 +706,36 @@ def reprocess_image(request, image_id):
     """Reprocess image with different ML model"""
     try:
         # Find the image
-        image = next((img for img in uploaded_images if img['image_id'] == image_id), None)
+        image = image_store.get(image_id)
         
         if not image:
             return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
         
         # Get parameters
-        use_roboflow = request.data.get('use_roboflow', True)
-        confidence_threshold = request.data.get('confidence_threshold', 0.1)
-        min_detection_size = request.data.get('min_detection_size', 20)
-        max_detections = request.data.get('max_detections', 50)
-        
-        print(f"Reprocessing image {image_id} with use_roboflow={use_roboflow}, confidence={confidence_threshold}")
+        use_roboflow = str(request.data.get('use_roboflow', True)).lower() == 'true'
+        backend = request.data.get('backend') or ('roboflow' if use_roboflow else 'yolo')
+        if backend not in ML_BACKENDS:
+            return Response({'error': f"backend must be one of {', '.join(ML_BACKENDS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            confidence_threshold, min_detection_size, max_detections = processing_parameters(
+                request.data.get('confidence_threshold', 0.1),
+                request.data.get('min_detection_size', 20),
+                request.data.get('max_detections', 50)
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # Unset: EAGER_PROCESSED_UPLOAD decides; false keeps the current processed image
+        render = request.data.get('render')
+        if render is not None:
+            render = str(render).lower() not in ('false', '0', 'no')
+        tiled = request.data.get('tiled')
+        if tiled is not None:
+            tiled = str(tiled).lower() in ('true', '1', 'yes')
+        
+        print(f"Reprocessing image {image_id} with backend={backend}, confidence={confidence_threshold}")
         
         # Update status to processing
-        for i, img in enumerate(uploaded_images):
-            if img['image_id'] == image_id:
-                uploaded_images[i]['status'] = 'processing'
-                break
+        image_store.update(image_id, status='processing')
         
         # Process with ML if available
         if ML_AVAILABLE:
@@ -375,44 +750,46 @@ def reprocess_image(request, image_id):
                     use_roboflow=use_roboflow,
                     confidence_threshold=confidence_threshold,
                     min_detection_size=min_detection_size,
-                    max_detections=max_detections
+                    max_detections=max_detections,
+                    content_hash=image.get('content_hash'),
+                    raw_predictions=image.get('raw_predictions'),
+                    render=render,
+                    backend=backend,
+                    tiled=tiled
                 )
                 
                 if ml_result and ml_result.get('status') == 'completed':
                     # Update with new results
-                    for i, img in enumerate(uploaded_images):
-                        if img['image_id'] == image_id:
-                            uploaded_images[i].update({
-                                'status': 'completed',
-                                'processed_image_url': ml_result.get('processed_image_url'),
-                                'analysis_results': ml_result.get('analysis_results'),
-                                'model_used': ml_result.get('model_used'),
-                                'ml_config': {
-                                    'confidence_threshold': confidence_threshold,
-                                    'min_detection_size': min_detection_size,
-                                    'max_detections': max_detections,
-                                    'model': 'roboflow' if use_roboflow else 'yolo'
-                                }
-                            })
-                            break
+                    updated_image = image_store.update(
+                        image_id,
+                        status='completed',
+                        processed_image_url=ml_result.get('processed_image_url', image.get('processed_image_url')),
+                        # Predictions of the previous run belong to its model and frame; never keep them
+                        raw_predictions=ml_result.get('raw_predictions'),
+                        analysis_results=ml_result.get('analysis_results'),
+                        model_used=ml_result.get('model_used'),
+                        ml_config={
+                            'confidence_threshold': confidence_threshold,
+                            'min_detection_size': min_detection_size,
+                            'max_detections': max_detections,
+                            'model': backend,
+                            'tiled': backend != 'yolo' and (settings.ML_TILED_INFERENCE if tiled is None else tiled)
+                        }
+                    )
                     
                     print(f"ML reprocessing completed for image {image_id}")
                     
                     return Response({
                         'message': 'Image reprocessed successfully',
                         'success': True,
-                        'data': uploaded_images[i]
+                        'data': with_overlay_url(request, updated_image)
                     })
                 else:
                     # ML processing failed
                     error_msg = ml_result.get('error', 'Unknown error') if ml_result else 'Processing failed'
                     
                     # Update status to failed
-                    for i, img in enumerate(uploaded_images):
-                        if img['image_id'] == image_id:
-                            uploaded_images[i]['status'] = 'ml_failed'
-                            uploaded_images[i]['error_message'] = error_msg
-                            break
+                    image_store.update(image_id, status='ml_failed', error_message=error_msg)
                     
                     return Response({
                         'message': 'Reprocessing failed',
@@ -425,11 +802,7 @@ def reprocess_image(request, image_id):
                 traceback.print_exc()
                 
                 # Update status to failed
-                for i, img in enumerate(uploaded_images):
-                    if img['image_id'] == image_id:
-                        uploaded_images[i]['status'] = 'ml_failed'
-                        uploaded_images[i]['error_message'] = f"ML processing failed: {str(ml_error)}"
-                        break
+                image_store.update(image_id, status='ml_failed', error_message=f"ML processing failed: {str(ml_error)}")
                 
                 return Response({
                     'message': 'Reprocessing failed',
@@ -438,15 +811,15 @@ def reprocess_image(request, image_id):
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         else:
             # ML not available
-            for i, img in enumerate(uploaded_images):
-                if img['image_id'] == image_id:
-                    uploaded_images[i]['status'] = 'ml_unavailable'
-                    uploaded_images[i]['analysis_results'] = {
-                        'message': 'ML processing not available',
-                        'total_detections': 0,
-                        'model_used': 'No ML available'
-                    }
-                    break
+            image_store.update(
+                image_id,
+                status='ml_unavailable',
+                analysis_results={
+                    'message': 'ML processing not available',
+                    'total_detections': 0,
+                    'model_used': 'No ML available'
+                }
+            )
             
             return Response({
                 'message': 'ML processing not available',
@@ -462,3 +835,106 @@ def reprocess_image(request, image_id):
             'success': False,
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_threshold_sweep(request, image_id):
+    """Detection counts for many confidence thresholds, from the stored raw predictions"""
+    try:
+        image = image_store.get(image_id)
+        
+        if not image:
+            return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        raw_predictions = image.get('raw_predictions')
+        if not raw_predictions:
+            return Response({
+                'error': 'No stored predictions for this image; reprocess it with Roboflow first'
+            }, status=status.HTTP_409_CONFLICT)
+        
+        floor = raw_predictions.get('floor', 0)
+        try:
+            if request.GET.get('thresholds'):
+                thresholds = sorted({float(value) for value in request.GET['thresholds'].split(',') if value.strip()})
+            else:
+                # Default sweep: every 0.05 from the floor up to 0.95
+                thresholds = [round(step * 0.05, 2) for step in range(1, 20) if step * 0.05 >= floor - 1e-9]
+            min_detection_size = int(request.GET.get('min_detection_size', 0))
+            max_detections = int(request.GET['max_detections']) if request.GET.get('max_detections') else None
+        except ValueError:
+            return Response({'error': 'thresholds, min_detection_size and max_detections must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        below_floor = [threshold for threshold in thresholds if threshold < floor]
+        if below_floor:
+            return Response({
+                'error': f"Thresholds below the stored confidence floor ({floor}) cannot be evaluated: {below_floor}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'success': True,
+            'data': {
+                'image_id': image_id,
+                'model_id': raw_predictions.get('model_id'),
+                'floor': floor,
+                'sweep': threshold_sweep(raw_predictions, thresholds, min_detection_size, max_detections)
+            }
+        })
+        
+    except Exception as e:
+        print(f"Error in get_threshold_sweep: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes(api_settings.DEFAULT_RENDERER_CLASSES + [OverlayRenderer])
+def get_image_overlay(request, image_id):
+    """
+    Processed image with detection boxes, rendered on request from the stored detections
+    
+    Query params: image_format (jpeg|webp), quality (1-95) and min_confidence. URLs
+    carrying the current detections version (?v=) are cached by clients for good.
+    """
+    try:
+        image = image_store.get(image_id)
+        
+        if not image:
+            return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        if not has_ml_analysis(image):
+            return Response({'error': 'Image has no ML analysis to draw'}, status=status.HTTP_409_CONFLICT)
+        
+        image_format = request.GET.get('image_format', settings.RENDER_FORMAT).upper()
+        if image_format not in OVERLAY_CONTENT_TYPES:
+            return Response({'error': 'image_format must be jpeg or webp'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            quality = int(request.GET.get('quality', settings.RENDER_QUALITY))
+            min_confidence = float(request.GET.get('min_confidence', 0))
+        except ValueError:
+            return Response({'error': 'quality and min_confidence must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= quality <= 95:
+            return Response({'error': 'quality must be between 1 and 95'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        version = overlay_version(image)
+        style = {'format': image_format, 'quality': quality, 'min_confidence': min_confidence}
+        key = overlay_cache.make_key(image_id, version, style)
+        etag = f'"{key}"'
+        if etag_matches(request, etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = overlay_cache.get(key)
+            if data is None:
+                data = render_overlay(image, image_format, quality, min_confidence)
+                overlay_cache.set(key, data)
+            response = HttpResponse(data, content_type=OVERLAY_CONTENT_TYPES[image_format])
+        
+        response['ETag'] = etag
+        if request.GET.get('v') == version:
+            # The versioned URL changes with the detections, so this response never goes stale
+            response['Cache-Control'] = f'public, max-age={settings.OVERLAY_MAX_AGE}, immutable'
+        else:
+            response['Cache-Control'] = 'public, no-cache'
+        return response
+        
+    except Exception as e:
+        print(f"Error in get_image_overlay: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,181 @@
+"""
+Micro-batching of single-image inference requests
+
+Interactive uploads reach a worker one at a time, so each would run its own
+forward pass. The micro-batcher queues those requests and a background
+thread flushes them as one batched model call once ML_MICROBATCH_SIZE images
+are waiting or the oldest has waited ML_MICROBATCH_WAIT_MS, then resolves
+each caller's future. It is off unless ML_MICROBATCH_WAIT_MS is set, since
+a worker running one task at a time never has a second request to batch.
+Batch-size and queue-wait histograms show how the latency/throughput
+trade-off is working out.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from django.conf import settings
+
+from .onnx_backend import onnx_detector
+
+# Upper bounds of the histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_WAIT_MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+# How long a caller waits for its batch before giving up
+RESULT_TIMEOUT_SECONDS = 120
+
+
+class Histogram:
+    """Counts of observed values per bucket upper bound, plus count and sum"""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.bounds) + 1)
+            self._count = 0
+            self._sum = 0.0
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+
+    def snapshot(self):
+        with self._lock:
+            labels = [str(bound) for bound in self.bounds] + ['+Inf']
+            return {
+                'buckets': [{'le': label, 'count': count} for label, count in zip(labels, self._counts)],
+                'count': self._count,
+                'sum': round(self._sum, 3),
+                'mean': round(self._sum / self._count, 3) if self._count else 0,
+            }
+
+
+class _Request:
+    __slots__ = ('image', 'confidence_threshold', 'enqueued', 'future')
+
+    def __init__(self, image, confidence_threshold):
+        self.image = image
+        self.confidence_threshold = confidence_threshold
+        self.enqueued = time.monotonic()
+        self.future = Future()
+
+
+class MicroBatcher:
+    """
+    Collects single-image requests into batched calls of predict_batch
+
+    predict_batch(images, confidence_threshold) must return one Roboflow-style
+    response per image. A batch runs at the lowest threshold among its
+    requests and each response is filtered back to its caller's threshold.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=None, max_wait_ms=None, name='batcher'):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size if max_batch_size is not None else settings.ML_MICROBATCH_SIZE
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else settings.ML_MICROBATCH_WAIT_MS
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+
+    @property
+    def enabled(self):
+        # Without a wait there is never a second request to batch with
+        return self.max_batch_size > 1 and self.max_wait_ms > 0
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork (Celery prefork), so start one per process
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-flush", daemon=True)
+                self._thread.start()
+
+    def submit(self, image, confidence_threshold: float = 0.1) -> Future:
+        """Queue a decoded image; the future resolves to its Roboflow-style response"""
+        self._ensure_worker()
+        request = _Request(image, confidence_threshold)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, image, confidence_threshold: float = 0.1):
+        """Blocking single-image prediction, batched with concurrent callers when enabled"""
+        if not self.enabled:
+            return self.predict_batch([image], confidence_threshold)[0]
+        return self.submit(image, confidence_threshold).result(timeout=RESULT_TIMEOUT_SECONDS)
+
+    def _run(self):
+        requests = self._queue
+        while True:
+            batch = [requests.get()]
+            deadline = batch[0].enqueued + self.max_wait_ms / 1000.0
+            while len(batch) < self.max_batch_size:
+                # Past the deadline, still take whatever is already queued
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(requests.get(timeout=remaining) if remaining > 0 else requests.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        started = time.monotonic()
+        self.batch_sizes.observe(len(batch))
+        for request in batch:
+            self.queue_wait_ms.observe((started - request.enqueued) * 1000)
+
+        try:
+            floor = min(request.confidence_threshold for request in batch)
+            responses = self.predict_batch([request.image for request in batch], floor)
+        except Exception as e:
+            print(f"Micro-batch of {len(batch)} failed: {str(e)}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for request, response in zip(batch, responses):
+            if request.confidence_threshold > floor:
+                response = {
+                    **response,
+                    'predictions': [
+                        prediction for prediction in response.get('predictions', [])
+                        if prediction.get('confidence', 0) >= request.confidence_threshold
+                    ],
+                }
+            request.future.set_result(response)
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'enabled': self.enabled,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'queued': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_ms': self.queue_wait_ms.snapshot(),
+        }
+
+    def reset_stats(self):
+        self.batch_sizes.reset()
+        self.queue_wait_ms.reset()
+
+
+# Process-wide batcher in front of the ONNX detector
+onnx_batcher = MicroBatcher(onnx_detector.predict_batch, name='onnx')
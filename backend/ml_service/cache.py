@@ -0,0 +1,123 @@
+"""
+Two-tier cache of ML processing results
+
+Results are keyed by the image content hash, the model and the processing
+parameters, so re-running the same model with the same settings on the same
+bytes is answered without calling Roboflow or YOLO again. Entries live in a
+per-process LRU in front of Redis, which is shared by every web and worker
+process and expires entries after INFERENCE_CACHE_TTL seconds.
+"""
+
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+
+# How long to stop trying Redis after a connection error
+REDIS_RETRY_SECONDS = 30
+
+
+class InferenceCache:
+    """LRU in front of an optional Redis tier, with hit/miss counters"""
+
+    def __init__(self, max_entries=None, ttl=None, redis_url=None, prefix='binsavvy:inference'):
+        self.max_entries = max_entries if max_entries is not None else settings.INFERENCE_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.INFERENCE_CACHE_TTL
+        self.redis_url = redis_url if redis_url is not None else settings.INFERENCE_CACHE_REDIS_URL
+        self.prefix = prefix
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._client = None
+        self._redis_down_until = 0.0
+        self._stats = {'memory_hits': 0, 'redis_hits': 0, 'misses': 0, 'stores': 0, 'redis_errors': 0}
+
+    @staticmethod
+    def make_key(content_hash, model_id, params):
+        """Cache key for one image, model and parameter set"""
+        encoded = json.dumps({'model': model_id, 'params': params}, sort_keys=True, default=str)
+        return f"{content_hash}:{hashlib.sha1(encoded.encode()).hexdigest()}"
+
+    def _redis(self):
+        if not self.redis_url or time.monotonic() < self._redis_down_until:
+            return None
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(self.redis_url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        return self._client
+
+    def _redis_failed(self, error):
+        print(f"Inference cache: Redis unavailable, using the in-process tier only: {str(error)}")
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        self._count('redis_errors')
+
+    def _count(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached result for key, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return value
+
+        client = self._redis()
+        if client is not None:
+            try:
+                raw = client.get(f"{self.prefix}:{key}")
+            except Exception as e:
+                self._redis_failed(e)
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._remember(key, value)
+                self._count('redis_hits')
+                return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        """Cache a result in both tiers"""
+        self._remember(key, value)
+        self._count('stores')
+
+        client = self._redis()
+        if client is not None:
+            try:
+                client.set(f"{self.prefix}:{key}", json.dumps(value), ex=self.ttl)
+            except Exception as e:
+                self._redis_failed(e)
+
+    def clear(self):
+        """Drop the in-process tier and reset the counters; Redis entries expire on their own"""
+        with self._lock:
+            self._entries.clear()
+            for counter in self._stats:
+                self._stats[counter] = 0
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['redis_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['redis_hits']) / lookups, 3) if lookups else 0.0
+        stats['redis_enabled'] = bool(self.redis_url)
+        return stats
+
+
+# Process-wide inference cache
+inference_cache = InferenceCache()
@@ -0,0 +1,156 @@
+"""
+Local CPU inference with an exported ONNX detection model
+
+Runs a YOLOv8-style ONNX export (`yolo export format=onnx`) with ONNX Runtime.
+Images are letterboxed with NumPy and the raw output is decoded with
+vectorized, class-aware NMS into Roboflow-style predictions (centre x/y,
+width and height in original-image pixels), so the result feeds the same
+analysis and rendering code as the Roboflow path.
+"""
+
+import ast
+import os
+import threading
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .postprocess import Detections, class_nms
+
+# Pad colour used by Ultralytics when letterboxing
+LETTERBOX_COLOR = 114
+
+
+def letterbox(image: Image.Image, size: int):
+    """
+    Resize image to fit a size x size square, keeping its aspect ratio, and pad the rest
+
+    Returns:
+        (CHW float32 array scaled to 0..1, scale ratio, (pad_x, pad_y))
+    """
+    width, height = image.size
+    ratio = min(size / width, size / height)
+    new_width, new_height = max(1, round(width * ratio)), max(1, round(height * ratio))
+    resized = image.convert('RGB').resize((new_width, new_height), Image.BILINEAR)
+
+    pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+    canvas = np.full((size, size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = np.asarray(resized)
+    return canvas.transpose(2, 0, 1).astype(np.float32) / 255.0, ratio, (pad_x, pad_y)
+
+
+class OnnxDetector:
+    """ONNX Runtime detector, loaded lazily once per process"""
+
+    def __init__(self, model_path=None):
+        self.model_path = model_path or settings.ONNX_MODEL_PATH
+        self.input_size = settings.ONNX_INPUT_SIZE
+        self.iou_threshold = settings.ONNX_IOU_THRESHOLD
+        self._lock = threading.Lock()
+        self._session = None
+        self._input_name = None
+        self._class_names = None
+
+    @property
+    def model_id(self):
+        return f"onnx:{os.path.basename(self.model_path)}"
+
+    def _load(self):
+        # Optional dependency, only needed for the local ONNX backend
+        import onnxruntime as ort
+
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"ONNX model not found at {self.model_path}; set ONNX_MODEL_PATH")
+
+        options = ort.SessionOptions()
+        if settings.ONNX_THREADS:
+            options.intra_op_num_threads = settings.ONNX_THREADS
+        session = ort.InferenceSession(self.model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+        # Ultralytics stores the class names in the model metadata as a dict literal
+        names = session.get_modelmeta().custom_metadata_map.get('names')
+        try:
+            parsed = ast.literal_eval(names) if names else {}
+            class_names = [parsed[index] for index in sorted(parsed)] if isinstance(parsed, dict) else list(parsed)
+        except (ValueError, SyntaxError):
+            class_names = []
+        if settings.ONNX_CLASS_NAMES:
+            class_names = [name.strip() for name in settings.ONNX_CLASS_NAMES.split(',')]
+
+        self._input_name = session.get_inputs()[0].name
+        self._class_names = class_names
+        self._session = session
+        print(f"Loaded ONNX model {self.model_path} with {len(class_names)} classes")
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._load()
+        return self._session
+
+    def _fixed_batch(self):
+        """Batch size baked into the exported model, or None when it is dynamic"""
+        batch = self.session.get_inputs()[0].shape[0]
+        return batch if isinstance(batch, int) else None
+
+    def _decode(self, output, ratio, pad, size, confidence_threshold):
+        """Turn one image's raw output into a Roboflow-style response"""
+        # YOLOv8 export: (4 + num_classes, anchors) with boxes as centre x/y, width, height
+        predictions = output.T
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+        mask = scores >= confidence_threshold
+        boxes, scores, class_ids = predictions[mask, :4], scores[mask], class_ids[mask]
+
+        # Undo the letterbox: back to original-image pixels
+        boxes[:, :2] = (boxes[:, :2] - pad) / ratio
+        boxes[:, 2:] /= ratio
+        detections = class_nms(Detections(boxes, scores, class_ids, self._class_names), self.iou_threshold)
+
+        width, height = size
+        return {
+            'image': {'width': width, 'height': height},
+            'predictions': detections.to_predictions(),
+        }
+
+    def predict_batch(self, images, confidence_threshold: float = 0.1):
+        """
+        Detect objects in several decoded images with one forward pass
+
+        Models exported with a fixed batch size of 1 are run once per image.
+
+        Returns:
+            Roboflow-style response per image, in input order
+        """
+        session = self.session
+        letterboxed = [letterbox(image, self.input_size) for image in images]
+        tensors = np.stack([tensor for tensor, _, _ in letterboxed]) if letterboxed else np.empty((0,))
+
+        if self._fixed_batch() == 1:
+            outputs = [session.run(None, {self._input_name: tensor[None]})[0][0] for tensor in tensors]
+        elif len(images):
+            outputs = session.run(None, {self._input_name: tensors})[0]
+        else:
+            outputs = []
+
+        return [
+            self._decode(output, ratio, pad, image.size, confidence_threshold)
+            for output, (_, ratio, pad), image in zip(outputs, letterboxed, images)
+        ]
+
+    def predict(self, image: Image.Image, confidence_threshold: float = 0.1):
+        """
+        Detect objects in a decoded image
+
+        Returns:
+            Roboflow-style response: {'image': {...}, 'predictions': [...]}
+        """
+        return self.predict_batch([image], confidence_threshold)[0]
+
+
+# Process-wide ONNX detector
+onnx_detector = OnnxDetector()
@@ -0,0 +1,76 @@
+"""
+Raw prediction storage and local re-thresholding
+
+Roboflow is queried once at a low confidence floor. The raw predictions are
+kept in a compact columnar form, so a later change to the confidence
+threshold, minimum detection size or detection cap can be applied without
+another inference call.
+"""
+
+from typing import Dict, List, Any
+import numpy as np
+
+from .postprocess import Detections, filter_detections, summarize
+
+# Rounding applied to stored predictions; coordinates are in pixels
+COORD_DIGITS = 1
+CONFIDENCE_DIGITS = 4
+
+
+def compact_predictions(roboflow_result: Dict[str, Any], floor: float, model_id: str) -> Dict[str, Any]:
+    """
+    Pack a Roboflow response into a compact, JSON-serialisable form
+
+    Each box is stored as [x, y, width, height, confidence, class_index] with
+    the class names listed once.
+    """
+    detections = Detections.from_predictions(roboflow_result.get('predictions', []))
+    rows = np.column_stack([
+        np.round(detections.boxes, COORD_DIGITS),
+        np.round(detections.scores, CONFIDENCE_DIGITS),
+    ]).tolist()
+    return {
+        'model_id': model_id,
+        'floor': floor,
+        'image': roboflow_result.get('image'),
+        'classes': detections.class_names,
+        'boxes': [row + [class_id] for row, class_id in zip(rows, detections.class_ids.tolist())],
+    }
+
+
+def rethreshold(raw_predictions: Dict[str, Any], confidence_threshold: float = 0.1,
+                min_detection_size: int = 0, max_detections: int = None) -> Detections:
+    """Apply the processing parameters to stored compact predictions"""
+    return filter_detections(Detections.from_compact(raw_predictions), confidence_threshold, min_detection_size, max_detections)
+
+
+def processing_parameters(confidence_threshold, min_detection_size, max_detections):
+    """
+    Coerce the processing parameters to (float, int, int)
+
+    Form-encoded requests send them as strings, which would otherwise fail
+    the comparisons with stored predictions.
+
+    Raises:
+        ValueError: a parameter is not a number
+    """
+    try:
+        return float(confidence_threshold), int(float(min_detection_size)), int(float(max_detections))
+    except (TypeError, ValueError):
+        raise ValueError('confidence_threshold, min_detection_size and max_detections must be numbers')
+
+
+def can_rethreshold(raw_predictions, model_id: str, confidence_threshold: float) -> bool:
+    """Whether raw_predictions from model_id cover confidence_threshold"""
+    return bool(raw_predictions) and raw_predictions.get('model_id') == model_id \
+        and raw_predictions.get('floor', 1.0) <= confidence_threshold
+
+
+def threshold_sweep(raw_predictions: Dict[str, Any], thresholds: List[float],
+                    min_detection_size: int = 0, max_detections: int = None) -> List[Dict[str, Any]]:
+    """Detection counts per class for each threshold, from one set of raw predictions"""
+    detections = Detections.from_compact(raw_predictions)
+    return [
+        {'threshold': threshold, **summarize(filter_detections(detections, threshold, min_detection_size, max_detections))}
+        for threshold in thresholds
+    ]
@@ -0,0 +1,137 @@
+"""
+Per-process registry of loaded YOLO models
+
+Loading YOLO weights takes seconds of CPU and hundreds of MB, so each process
+loads a given (weights, device) pair once and reuses it across tasks. Celery
+workers warm the default model when their process starts.
+"""
+
+import sys
+import threading
+import time
+from django.conf import settings
+from PIL import Image
+
+from .postprocess import Detections
+
+
+def _process_peak_rss_bytes():
+    """Peak resident set size of this process, or None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _parameter_bytes(model):
+    """Bytes held by the model's parameters and buffers, or None if unknown"""
+    try:
+        network = model.model
+        tensors = list(network.parameters()) + list(network.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    except Exception:
+        return None
+
+
+class ModelRegistry:
+    """Lazily loaded YOLO models keyed by (weights, device)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._info = {}
+
+    @staticmethod
+    def _key(weights, device):
+        return (weights or settings.YOLO_WEIGHTS, device if device is not None else (settings.YOLO_DEVICE or None))
+
+    def _load(self, weights, device):
+        # Lazy import to avoid heavy dependency at startup
+        from ultralytics import YOLO  # type: ignore
+
+        try:
+            model = YOLO(weights)
+        except Exception as model_error:
+            print(f"Error loading YOLO model: {model_error}")
+            # Try with weights_only=False as fallback
+            model = YOLO(weights, weights_only=False)
+        if device:
+            model.to(device)
+        return model
+
+    def get(self, weights=None, device=None):
+        """Return the model for weights on device, loading it on first use"""
+        key = self._key(weights, device)
+        model = self._models.get(key)
+        if model is not None:
+            return model
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                started = time.perf_counter()
+                model = self._load(*key)
+                self._models[key] = model
+                self._info[key] = {
+                    'weights': key[0],
+                    'device': key[1] or 'auto',
+                    'loaded_at': time.time(),
+                    'load_seconds': round(time.perf_counter() - started, 3),
+                    'parameter_bytes': _parameter_bytes(model),
+                    'warmed_up': False,
+                }
+                print(f"Loaded YOLO model {key[0]} on {key[1] or 'auto'} in {self._info[key]['load_seconds']}s")
+        return model
+
+    def warm_up(self, weights=None, device=None, size=640):
+        """Load the model and run one dummy inference so the first real request is fast"""
+        key = self._key(weights, device)
+        model = self.get(*key)
+        started = time.perf_counter()
+        model(Image.new('RGB', (size, size)), verbose=False)
+        self._info[key]['warmed_up'] = True
+        self._info[key]['warm_up_seconds'] = round(time.perf_counter() - started, 3)
+        return model
+
+    def predict_batch(self, images, confidence_threshold: float = 0.1, weights=None, device=None):
+        """
+        Detect objects in several decoded images with one batched model call
+
+        Returns:
+            Roboflow-style response per image, in input order
+        """
+        if not images:
+            return []
+        model = self.get(weights, device)
+        results = model(list(images), conf=confidence_threshold, verbose=False)
+        names = getattr(model, 'names', None) or {}
+        class_names = [names[index] for index in sorted(names)] if isinstance(names, dict) else list(names)
+
+        responses = []
+        for image, result in zip(images, results):
+            boxes = result.boxes
+            detections = Detections.from_xyxy(
+                boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int), class_names
+            )
+            width, height = image.size
+            responses.append({'image': {'width': width, 'height': height}, 'predictions': detections.to_predictions()})
+        return responses
+
+    def unload(self, weights=None, device=None):
+        with self._lock:
+            key = self._key(weights, device)
+            self._models.pop(key, None)
+            self._info.pop(key, None)
+
+    def loaded(self):
+        """Describe every loaded model and the process memory high-water mark"""
+        return {
+            'models': [dict(info) for info in self._info.values()],
+            'process_peak_rss_bytes': _process_peak_rss_bytes(),
+        }
+
+
+# Process-wide model registry
+model_registry = ModelRegistry()
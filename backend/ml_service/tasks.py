@@ -1,140 +1,129 @@
 import os
-import tempfile
 import base64
-import requests
 from celery import shared_task
+from celery.signals import worker_process_init, worker_ready
 import django
 from django.conf import settings
 from cloudinary_config import upload_processed_image
 from roboflow_config import roboflow_config
-from PIL import Image, ImageDraw, ImageFont
+from roboflow_async import async_roboflow_client
+from http_client import http_client
+from PIL import Image
 import io
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure Django settings for Celery tasks
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'binsavvy.settings')
 django.setup()
 
-def download_image_from_url(image_url: str) -> str:
-    """Download image from URL and return temporary file path"""
+from images.store import image_store, apply_ml_result
+from .cache import inference_cache
+from .predictions import compact_predictions, rethreshold, can_rethreshold, processing_parameters
+from .postprocess import build_analysis
+from .registry import model_registry
+from .onnx_backend import onnx_detector
+from .batcher import onnx_batcher
+from .tiling import predict_tiled, tiled_model_id
+from .renderer import render_detections
+
+YOLO_MODEL_ID = settings.YOLO_WEIGHTS
+ML_BACKENDS = ('roboflow', 'yolo', 'onnx')
+
+@worker_process_init.connect
+def warm_up_yolo_model(**kwargs):
+    """Load and warm the YOLO model once per worker process, before tasks arrive"""
+    if not settings.YOLO_WARMUP:
+        return
+    try:
+        model_registry.warm_up()
+        print(f"YOLO model {YOLO_MODEL_ID} warmed up")
+    except ImportError:
+        print("YOLO warm-up skipped: ultralytics is not installed")
+    except Exception as e:
+        print(f"YOLO warm-up failed: {str(e)}")
+
+@worker_ready.connect
+def warm_up_yolo_model_in_worker(sender=None, **kwargs):
+    """
+    Same warm-up for pools that run tasks in the main worker process
+    
+    worker_process_init only fires in prefork children; eventlet, gevent,
+    solo and threads pools (the documented `-P eventlet` setup) never send it.
+    """
+    from celery.concurrency.prefork import TaskPool as PreforkPool
+    if isinstance(getattr(sender, 'pool', None), PreforkPool):
+        # Children warmed up in worker_process_init; the parent runs no tasks
+        return
+    warm_up_yolo_model()
+
+def download_image_from_url(image_url: str) -> bytes:
+    """Download image from URL into memory"""
     try:
-        response = requests.get(image_url, timeout=30)
+        response = http_client.get(image_url)
         response.raise_for_status()
-        
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            temp_file.write(response.content)
-            return temp_file.name
+        return response.content
     except Exception as e:
         print(f"Error downloading image from URL: {e}")
         raise e
 
-def create_processed_image_with_detections(image_path: str, predictions: list, confidence_threshold: float = 0.1) -> str:
+def create_processed_image_with_detections(image_source, predictions: list, confidence_threshold: float = 0.1, frame_size: dict = None) -> io.BytesIO:
     """
     Create a processed image with detection boxes and labels
     
     Args:
-        image_path: Path to the original image
+        image_source: Original image as bytes, memoryview or a file-like object
         predictions: List of predictions from ML model
         confidence_threshold: Minimum confidence threshold
+        frame_size: Size of the frame the predictions were made on; boxes are
+            scaled when image_source differs (e.g. the 800x600 Cloudinary copy)
     
     Returns:
-        Path to the processed image file
+        In-memory processed image (RENDER_FORMAT), ready to upload
     """
+    if isinstance(image_source, (bytes, bytearray, memoryview)):
+        image_source = io.BytesIO(image_source)
     try:
-        # Open the original image
-        with Image.open(image_path) as img:
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Create a copy for drawing
-            processed_img = img.copy()
-            draw = ImageDraw.Draw(processed_img)
-            
-            # Try to load a font, fallback to default if not available
-            try:
-                font = ImageFont.truetype("arial.ttf", 16)
-            except:
-                font = ImageFont.load_default()
-            
-            # Filter predictions by confidence threshold
-            filtered_predictions = [p for p in predictions if p.get('confidence', 0) >= confidence_threshold]
-            print(f"DEBUG: Total predictions: {len(predictions)}")
-            print(f"DEBUG: Filtered predictions: {filtered_predictions}")
-            print(f"DEBUG: Image size: {img.size}")
-            
-            # Draw detection boxes
-            for prediction in filtered_predictions:
-                # Extract bounding box coordinates
-                # Roboflow returns coordinates as percentages of image dimensions
-                x_pct = prediction.get('x', 0)
-                y_pct = prediction.get('y', 0)
-                width_pct = prediction.get('width', 0)
-                height_pct = prediction.get('height', 0)
-                confidence = prediction.get('confidence', 0)
-                class_name = prediction.get('class', 'Garbage')
-                
-                # Convert percentages to pixel coordinates
-                img_width, img_height = img.size
-                x = x_pct * img_width / 100
-                y = y_pct * img_height / 100
-                width = width_pct * img_width / 100
-                height = height_pct * img_height / 100
-                
-                # Calculate box coordinates
-                x1 = x - width / 2
-                y1 = y - height / 2
-                x2 = x + width / 2
-                y2 = y + height / 2
-                
-                # Draw rectangle
-                draw.rectangle([x1, y1, x2, y2], outline='red', width=3)
-                
-                # Draw label
-                label = f"{class_name} {confidence:.2f}"
-                label_bbox = draw.textbbox((x1, y1 - 20), label, font=font)
-                draw.rectangle(label_bbox, fill='red')
-                draw.text((x1, y1 - 20), label, fill='white', font=font)
-            
-            # If no detections found, add a text overlay to show processing was done
-            if not filtered_predictions:
-                # Add a semi-transparent overlay
-                overlay = Image.new('RGBA', img.size, (0, 0, 0, 100))
-                processed_img = Image.alpha_composite(processed_img.convert('RGBA'), overlay).convert('RGB')
-                draw = ImageDraw.Draw(processed_img)
-                
-                # Add text
-                text = "No garbage detected"
-                text_bbox = draw.textbbox((0, 0), text, font=font)
-                text_width = text_bbox[2] - text_bbox[0]
-                text_height = text_bbox[3] - text_bbox[1]
-                
-                # Center the text
-                x = (img_width - text_width) // 2
-                y = (img_height - text_height) // 2
-                
-                # Draw text background
-                draw.rectangle([x-10, y-10, x+text_width+10, y+text_height+10], fill='red')
-                draw.text((x, y), text, fill='white', font=font)
-            
-            # Save processed image to temporary file
-            temp_processed_path = tempfile.mktemp(suffix='.jpg')
-            processed_img.save(temp_processed_path, 'JPEG', quality=95)
-            print(f"DEBUG: Processed image saved to: {temp_processed_path}")
-            print(f"DEBUG: File exists: {os.path.exists(temp_processed_path)}")
-            print(f"DEBUG: File size: {os.path.getsize(temp_processed_path) if os.path.exists(temp_processed_path) else 'N/A'}")
-            
-            return temp_processed_path
-            
+        processed_buffer = render_detections(image_source, predictions, confidence_threshold, frame_size=frame_size)
+        print(f"DEBUG: Processed image rendered ({processed_buffer.getbuffer().nbytes} bytes)")
+        return processed_buffer
     except Exception as e:
         print(f"Error creating processed image: {e}")
-        # Return original image path if processing fails
-        return image_path
+        # Return the original image if processing fails
+        image_source.seek(0)
+        return image_source
 
-def process_image_with_roboflow_sync(image_id: str, image_url: str, location: str = "", confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50):
+def predict_roboflow_images(images: list, confidence_threshold: float = 0.1):
+    """Roboflow predictions for decoded images (e.g. tiles), posted concurrently"""
+    def predict(image):
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=90)
+        return roboflow_config.predict_image_bytes(buffer.getvalue(), confidence_threshold)
+    
+    with ThreadPoolExecutor(max_workers=max(1, len(images))) as pool:
+        return list(pool.map(predict, images))
+
+def wants_upload(result: dict, render: bool = None) -> bool:
+    """
+    Whether to draw and upload the processed image now
+    
+    render=None follows EAGER_PROCESSED_UPLOAD. When that is off, the stale
+    processed_image_url is cleared so the overlay endpoint renders the new
+    detections on request; render=False leaves the stored URL untouched.
+    """
+    if render is None:
+        if settings.EAGER_PROCESSED_UPLOAD:
+            return True
+        result['processed_image_url'] = None
+        return False
+    return render
+
+def process_image_with_roboflow_sync(image_id: str, image_url: str, location: str = "", confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50, image_bytes: bytes = None, roboflow_result: dict = None, raw_predictions: dict = None, render: bool = None, tiled: bool = None):
     """
     Process image using Roboflow waste detection model
     
+    Roboflow is queried at ML_CONFIDENCE_FLOOR and the raw predictions are
+    returned in compact form; the thresholds below are applied locally.
+    
     Args:
         image_id: Unique identifier for the image
         image_url: Cloudinary URL of the image
@@ -142,60 +131,93 @@ def process_image_with_roboflow_sync(image_id: str, image_url: str, location: st
         confidence_threshold: Minimum confidence for detections (0.0-1.0)
         min_detection_size: Minimum detection size in pixels
         max_detections: Maximum number of detections per image
+        image_bytes: Already-received image bytes; when given, they are posted to
+            Roboflow and used for rendering instead of re-downloading image_url
+        roboflow_result: Raw predictions obtained elsewhere (e.g. a batch run);
+            when given, the Roboflow call is skipped
+        raw_predictions: Stored compact predictions of an earlier run; when they
+            cover confidence_threshold, they are re-filtered instead of calling Roboflow
+        render: Whether to draw and upload a new processed image (defaults to
+            EAGER_PROCESSED_UPLOAD; otherwise /api/images/<id>/overlay/ draws it)
+        tiled: Also detect over overlapping tiles (defaults to ML_TILED_INFERENCE)
     """
-    temp_file_path = None
     try:
-        print(f"Processing image {image_id} with Roboflow from URL: {image_url}")
-        
-        # Download image from Cloudinary URL
-        temp_file_path = download_image_from_url(image_url)
-        
-        # Process with Roboflow directly from URL
-        roboflow_result = roboflow_config.predict_image_from_url(image_url, confidence_threshold)
-        print(f"DEBUG: Raw Roboflow result: {roboflow_result}")
+        tiled = settings.ML_TILED_INFERENCE if tiled is None else tiled
+        model_id = tiled_model_id(roboflow_config.model_id) if tiled else roboflow_config.model_id
+        if can_rethreshold(raw_predictions, model_id, confidence_threshold):
+            print(f"Re-filtering stored predictions for image {image_id} (floor {raw_predictions['floor']})")
+        else:
+            floor = min(settings.ML_CONFIDENCE_FLOOR, float(confidence_threshold))
+            if roboflow_result is None and tiled:
+                print(f"Processing image {image_id} with Roboflow over tiles")
+                if image_bytes is None:
+                    image_bytes = download_image_from_url(image_url)
+                with Image.open(io.BytesIO(image_bytes)) as img:
+                    roboflow_result = predict_tiled(img.convert('RGB'), predict_roboflow_images, floor)
+            elif roboflow_result is None:
+                if image_bytes is not None:
+                    print(f"Processing image {image_id} with Roboflow from {len(image_bytes)} in-memory bytes")
+                    # Post the bytes we already hold instead of making Roboflow fetch the URL
+                    roboflow_result = roboflow_config.predict_image_bytes(image_bytes, floor)
+                else:
+                    print(f"Processing image {image_id} with Roboflow from URL: {image_url}")
+                    # Process with Roboflow directly from URL
+                    roboflow_result = roboflow_config.predict_image_from_url(image_url, floor)
+            print(f"DEBUG: Raw Roboflow result: {roboflow_result}")
+            raw_predictions = None if 'error' in roboflow_result else compact_predictions(roboflow_result, floor, model_id)
         
         # Analyze predictions
-        analysis_results = roboflow_config.analyze_predictions(roboflow_result)
+        if raw_predictions is not None:
+            kept = rethreshold(raw_predictions, float(confidence_threshold), int(min_detection_size), int(max_detections))
+            predictions = kept.to_predictions()
+            analysis_results = build_analysis(kept, model_id, predictions)
+        else:
+            predictions = []
+            analysis_results = roboflow_config.analyze_predictions(roboflow_result)
         print(f"DEBUG: Analysis results: {analysis_results}")
         
+        result = {
+            'image_id': image_id,
+            'analysis_results': analysis_results,
+            'raw_predictions': raw_predictions,
+            'status': 'completed',
+            'model_used': 'Roboflow Waste Detection v2'
+        }
+        if not wants_upload(result, render):
+            return result
+        
+        if image_bytes is None:
+            # Download image from Cloudinary URL into memory
+            image_bytes = download_image_from_url(image_url)
+        image_source = io.BytesIO(image_bytes)
+        
         # Create and upload processed image with detection overlays
         processed_image_url = None
         print(f"DEBUG: Total detections: {analysis_results.get('total_detections', 0)}")
-        print(f"DEBUG: Predictions: {roboflow_result.get('predictions', [])}")
         
         try:
             print(f"DEBUG: Creating processed image...")
             # Always create a processed image, even if no detections
-            processed_image_path = create_processed_image_with_detections(
-                temp_file_path, 
-                roboflow_result.get('predictions', []), 
-                confidence_threshold
+            processed_image = create_processed_image_with_detections(
+                image_source, 
+                predictions, 
+                confidence_threshold,
+                frame_size=(raw_predictions or {}).get('image')
             )
             
-            print(f"DEBUG: Processed image created at: {processed_image_path}")
-            
-            # Upload processed image to Cloudinary
-            processed_image_url = upload_processed_image(processed_image_path, folder="binsavvy/processed")
+            # Upload processed image to Cloudinary straight from the buffer
+            processed_image_url = upload_processed_image(processed_image, folder="binsavvy/processed")
             print(f"DEBUG: Processed image uploaded to: {processed_image_url}")
             print(f"DEBUG: Original image URL: {image_url}")
             print(f"DEBUG: URLs are same: {processed_image_url == image_url}")
-            
-            # Clean up temporary processed image
-            if processed_image_path != temp_file_path and os.path.exists(processed_image_path):
-                os.unlink(processed_image_path)
                 
         except Exception as upload_error:
             print(f"Error uploading processed image: {upload_error}")
             # Fallback to original image
             processed_image_url = image_url
         
-        return {
-            'image_id': image_id,
-            'processed_image_url': processed_image_url,
-            'analysis_results': analysis_results,
-            'status': 'completed',
-            'model_used': 'Roboflow Waste Detection v2'
-        }
+        result['processed_image_url'] = processed_image_url
+        return result
         
     except Exception as e:
         print(f"Error processing image with Roboflow: {str(e)}")
@@ -204,15 +226,15 @@ def process_image_with_roboflow_sync(image_id: str, image_url: str, location: st
             'error': str(e),
             'status': 'failed'
         }
-    finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
 
-def process_image_with_yolo_sync(image_id: str, image_url: str, location: str = "", confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50):
+def process_image_with_yolo_sync(image_id: str, image_url: str, location: str = "", confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50, image_bytes: bytes = None, raw_predictions: dict = None, render: bool = None):
     """
     Process image using local YOLOv8 model (fallback)
     
+    Detection runs at ML_CONFIDENCE_FLOOR through the model registry and the
+    thresholds are applied locally, so the result has the same detections and
+    stored raw predictions as the ONNX and batched paths.
+    
     Args:
         image_id: Unique identifier for the image
         image_url: Cloudinary URL of the image
@@ -220,141 +242,135 @@ def process_image_with_yolo_sync(image_id: str, image_url: str, location: str =
         confidence_threshold: Minimum confidence for detections (0.0-1.0)
         min_detection_size: Minimum detection size in pixels
         max_detections: Maximum number of detections per image
+        image_bytes: Already-received image bytes; when given, they are used
+            instead of re-downloading image_url
+        raw_predictions: Stored compact predictions; re-filtered instead of
+            running the model when they come from it and cover the threshold
+        render: Whether to draw and upload a processed image (defaults to EAGER_PROCESSED_UPLOAD)
     """
-    temp_file_path = None
     try:
-        print(f"Processing image {image_id} with YOLOv8 from URL: {image_url}")
-        
-        # Download image from Cloudinary URL
-        temp_file_path = download_image_from_url(image_url)
+        if image_bytes is not None:
+            print(f"Processing image {image_id} with YOLOv8 from {len(image_bytes)} in-memory bytes")
+        else:
+            print(f"Processing image {image_id} with YOLOv8 from URL: {image_url}")
+            
+            # Download image from Cloudinary URL into memory
+            image_bytes = download_image_from_url(image_url)
+        image_source = io.BytesIO(image_bytes)
         
-        # Load YOLO model
-        try:
-            # Lazy import to avoid heavy dependency at startup
-            from ultralytics import YOLO  # type: ignore
-            model = YOLO('yolov8n-seg.pt')
-        except Exception as model_error:
-            print(f"Error loading YOLO model: {model_error}")
-            # Try with weights_only=False as fallback
+        if can_rethreshold(raw_predictions, YOLO_MODEL_ID, confidence_threshold):
+            print(f"Re-filtering stored predictions for image {image_id} (floor {raw_predictions['floor']})")
+        else:
+            # Reuse this process's loaded YOLO model
             try:
-                from ultralytics import YOLO  # type: ignore
-                model = YOLO('yolov8n-seg.pt', weights_only=False)
-            except Exception as fallback_error:
-                print(f"Fallback YOLO loading also failed: {fallback_error}")
+                model_registry.get()
+            except Exception as model_error:
+                print(f"YOLO model loading failed: {model_error}")
                 return {
                     'image_id': image_id,
-                    'error': f'YOLO model loading failed: {str(fallback_error)}',
+                    'error': f'YOLO model loading failed: {str(model_error)}',
                     'status': 'failed'
                 }
+            
+            floor = min(settings.ML_CONFIDENCE_FLOOR, float(confidence_threshold))
+            with Image.open(image_source) as img:
+                yolo_result = model_registry.predict_batch([img.convert('RGB')], floor)[0]
+            image_source.seek(0)
+            raw_predictions = compact_predictions(yolo_result, floor, YOLO_MODEL_ID)
         
-        # Run inference
-        results = model(temp_file_path)
-        
-        # Process results
-        detections = []
-        for result in results:
-            if result.boxes is not None:
-                for box in result.boxes:
-                    confidence = float(box.conf[0]) if len(box.conf) > 0 else 0
-                    
-                    # Filter by confidence threshold
-                    if confidence < confidence_threshold:
-                        continue
-                    
-                    # Calculate detection size
-                    bbox = box.xyxy[0].tolist() if len(box.xyxy) > 0 else []
-                    if len(bbox) == 4:
-                        width = bbox[2] - bbox[0]
-                        height = bbox[3] - bbox[1]
-                        size = min(width, height)
-                        
-                        # Filter by minimum detection size
-                        if size < min_detection_size:
-                            continue
-                    
-                    detection = {
-                        'class': int(box.cls[0]) if len(box.cls) > 0 else 0,
-                        'confidence': confidence,
-                        'bbox': bbox
-                    }
-                    detections.append(detection)
-                    
-                    # Limit to max detections
-                    if len(detections) >= max_detections:
-                        break
-        
-        # Create analysis results
-        analysis_results = {
-            'total_detections': len(detections),
-            'detections': detections,
-            'model_used': 'YOLOv8 Local Model',
-            'message': f'Found {len(detections)} objects in image'
-        }
-        
-        # Create and upload processed image with detection overlays
-        processed_image_url = None
-        if len(detections) > 0:
-            try:
-                # Convert YOLO detections to the format expected by create_processed_image_with_detections
-                predictions = []
-                for detection in detections:
-                    bbox = detection['bbox']
-                    if len(bbox) == 4:
-                        x = (bbox[0] + bbox[2]) / 2  # center x
-                        y = (bbox[1] + bbox[3]) / 2  # center y
-                        width = bbox[2] - bbox[0]    # width
-                        height = bbox[3] - bbox[1]   # height
-                        
-                        predictions.append({
-                            'x': x,
-                            'y': y,
-                            'width': width,
-                            'height': height,
-                            'confidence': detection['confidence'],
-                            'class': 'Garbage'  # YOLO doesn't have specific waste classes
-                        })
-                
-                # Create processed image with detection boxes
-                processed_image_path = create_processed_image_with_detections(
-                    temp_file_path, 
-                    predictions, 
-                    confidence_threshold
-                )
-                
-                # Upload processed image to Cloudinary
-                processed_image_url = upload_processed_image(processed_image_path, folder="binsavvy/processed")
-                
-                # Clean up temporary processed image
-                if processed_image_path != temp_file_path and os.path.exists(processed_image_path):
-                    os.unlink(processed_image_path)
-                    
-            except Exception as upload_error:
-                print(f"Error uploading processed image: {upload_error}")
-                # Fallback to original image
-                processed_image_url = image_url
+        return finish_local_result(image_id, image_url, image_source, raw_predictions, YOLO_MODEL_ID, 'YOLOv8 Local Model',
+                                   confidence_threshold, min_detection_size, max_detections, render)
         
+    except Exception as e:
+        print(f"Error processing image with YOLOv8: {str(e)}")
         return {
             'image_id': image_id,
-            'processed_image_url': processed_image_url,
-            'analysis_results': analysis_results,
-            'status': 'completed',
-            'model_used': 'YOLOv8 Local Model'
+            'error': str(e),
+            'status': 'failed'
         }
+
+def finish_local_result(image_id: str, image_url: str, image_source, raw_predictions: dict, model_id: str, model_used: str,
+                        confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50, render: bool = None):
+    """
+    Build the processing result for a local model from its raw predictions
+    
+    Applies the thresholds, builds analysis_results and, when wants_upload
+    agrees, draws and uploads the processed image from image_source (bytes or buffer).
+    """
+    kept = rethreshold(raw_predictions, float(confidence_threshold), int(min_detection_size), int(max_detections))
+    predictions = kept.to_predictions()
+    
+    result = {
+        'image_id': image_id,
+        'analysis_results': build_analysis(kept, model_id, predictions),
+        'raw_predictions': raw_predictions,
+        'status': 'completed',
+        'model_used': model_used
+    }
+    if not wants_upload(result, render):
+        return result
+    
+    # Create and upload processed image with detection overlays
+    try:
+        processed_image = create_processed_image_with_detections(image_source, predictions, confidence_threshold,
+                                                                 frame_size=raw_predictions.get('image'))
+        result['processed_image_url'] = upload_processed_image(processed_image, folder="binsavvy/processed")
+    except Exception as upload_error:
+        print(f"Error uploading processed image: {upload_error}")
+        # Fallback to original image
+        result['processed_image_url'] = image_url
+    
+    return result
+
+def process_image_with_onnx_sync(image_id: str, image_url: str, location: str = "", confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50, image_bytes: bytes = None, raw_predictions: dict = None, render: bool = None, tiled: bool = None):
+    """
+    Process image with the local ONNX Runtime detector (CPU, no network calls)
+    
+    Takes the same arguments as process_image_with_roboflow_sync and returns
+    the same result shape. Detection runs at ML_CONFIDENCE_FLOOR and the
+    thresholds are applied locally.
+    """
+    try:
+        if image_bytes is not None:
+            print(f"Processing image {image_id} with ONNX from {len(image_bytes)} in-memory bytes")
+        else:
+            print(f"Processing image {image_id} with ONNX from URL: {image_url}")
+            
+            # Download image from Cloudinary URL into memory
+            image_bytes = download_image_from_url(image_url)
+        image_source = io.BytesIO(image_bytes)
+        
+        tiled = settings.ML_TILED_INFERENCE if tiled is None else tiled
+        model_id = tiled_model_id(onnx_detector.model_id) if tiled else onnx_detector.model_id
+        if can_rethreshold(raw_predictions, model_id, confidence_threshold):
+            print(f"Re-filtering stored predictions for image {image_id} (floor {raw_predictions['floor']})")
+        else:
+            floor = min(settings.ML_CONFIDENCE_FLOOR, float(confidence_threshold))
+            with Image.open(image_source) as img:
+                if tiled:
+                    # Tiles are already batched, so they skip the micro-batcher
+                    onnx_result = predict_tiled(img.convert('RGB'), onnx_detector.predict_batch, floor)
+                else:
+                    # Concurrent requests in this process share one forward pass
+                    onnx_result = onnx_batcher.predict(img.convert('RGB'), floor)
+            image_source.seek(0)
+            raw_predictions = compact_predictions(onnx_result, floor, model_id)
+        
+        return finish_local_result(image_id, image_url, image_source, raw_predictions, model_id, 'ONNX Runtime Local Model',
+                                   confidence_threshold, min_detection_size, max_detections, render)
         
     except Exception as e:
-        print(f"Error processing image with YOLOv8: {str(e)}")
+        print(f"Error processing image with ONNX: {str(e)}")
         return {
             'image_id': image_id,
             'error': str(e),
             'status': 'failed'
         }
-    finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
 
 def process_image(image_id: str, image_url: str, location: str = "", use_roboflow: bool = True, 
-                 confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50):
+                 confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50,
+                 image_bytes: bytes = None, content_hash: str = None, raw_predictions: dict = None,
+                 render: bool = None, backend: str = None, tiled: bool = None):
     """
     Main function to process image with ML models
     
@@ -366,14 +382,51 @@ def process_image(image_id: str, image_url: str, location: str = "", use_roboflo
         confidence_threshold: Minimum confidence for detections (0.0-1.0)
         min_detection_size: Minimum detection size in pixels
         max_detections: Maximum number of detections per image
+        image_bytes: Optional in-memory image bytes reused for inference and rendering
+        content_hash: SHA-256 of the image bytes; when given, results are served
+            from and stored in the inference cache
+        raw_predictions: Stored predictions to re-filter instead of re-running inference
+        render: Whether to draw and upload a new processed image (defaults to EAGER_PROCESSED_UPLOAD)
+        backend: 'roboflow', 'yolo' or 'onnx'; defaults to Roboflow or YOLO per use_roboflow
+        tiled: Also detect over overlapping tiles (Roboflow and ONNX; defaults to ML_TILED_INFERENCE)
     """
     try:
-        print(f"Starting ML processing for image {image_id} with confidence={confidence_threshold}")
+        confidence_threshold, min_detection_size, max_detections = processing_parameters(confidence_threshold, min_detection_size, max_detections)
+        backend = backend or ('roboflow' if use_roboflow else 'yolo')
+        if backend not in ML_BACKENDS:
+            raise ValueError(f"Unknown ML backend '{backend}', expected one of {', '.join(ML_BACKENDS)}")
+        print(f"Starting ML processing for image {image_id} with backend={backend}, confidence={confidence_threshold}")
+        
+        cache_key = None
+        if content_hash and render is not False:
+            model_id = {'roboflow': roboflow_config.model_id, 'yolo': YOLO_MODEL_ID, 'onnx': onnx_detector.model_id}[backend]
+            if backend != 'yolo' and (settings.ML_TILED_INFERENCE if tiled is None else tiled):
+                model_id = tiled_model_id(model_id)
+            cache_key = inference_cache.make_key(content_hash, model_id, {
+                'confidence_threshold': float(confidence_threshold),
+                'min_detection_size': int(min_detection_size),
+                'max_detections': int(max_detections),
+                'eager_upload': settings.EAGER_PROCESSED_UPLOAD if render is None else render
+            })
+            cached = inference_cache.get(cache_key)
+            if cached is not None:
+                print(f"Inference cache hit for image {image_id}")
+                return dict(cached, image_id=image_id)
         
-        if use_roboflow:
-            return process_image_with_roboflow_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections)
+        if backend == 'roboflow':
+            result = process_image_with_roboflow_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections, image_bytes,
+                                                      raw_predictions=raw_predictions, render=render, tiled=tiled)
+        elif backend == 'onnx':
+            result = process_image_with_onnx_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections, image_bytes,
+                                                  raw_predictions=raw_predictions, render=render, tiled=tiled)
         else:
-            return process_image_with_yolo_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections)
+            result = process_image_with_yolo_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections, image_bytes,
+                                                  raw_predictions=raw_predictions, render=render)
+        
+        # Only cache real detections; errors reported inside the analysis should be retried
+        if cache_key and result.get('status') == 'completed' and 'error' not in (result.get('analysis_results') or {}):
+            inference_cache.set(cache_key, result)
+        return result
             
     except Exception as e:
         print(f"Error in process_image: {str(e)}")
@@ -383,13 +436,175 @@ def process_image(image_id: str, image_url: str, location: str = "", use_roboflo
             'status': 'failed'
         }
 
-# Celery task versions for future async processing
+# Celery task versions for async processing; results are written back to the image store
 @shared_task
 def process_image_with_roboflow(image_id: str, image_url: str, location: str = "", confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50):
     """Celery task version of Roboflow processing"""
-    return process_image_with_roboflow_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections)
+    result = process_image_with_roboflow_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections)
+    apply_ml_result(image_id, result)
+    return result
 
 @shared_task
 def process_image_with_yolo(image_id: str, image_url: str, location: str = "", confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50):
     """Celery task version of YOLO processing"""
-    return process_image_with_yolo_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections)
\ No newline at end of file
+    result = process_image_with_yolo_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections)
+    apply_ml_result(image_id, result)
+    return result
+
+@shared_task
+def process_image_with_onnx(image_id: str, image_url: str, location: str = "", confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50):
+    """Celery task version of local ONNX processing"""
+    result = process_image_with_onnx_sync(image_id, image_url, location, confidence_threshold, min_detection_size, max_detections)
+    apply_ml_result(image_id, result)
+    return result
+
+@shared_task
+def process_images_with_roboflow_batch(image_ids: list, confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50, concurrency: int = None, tiled: bool = None):
+    """
+    Reprocess many stored images with Roboflow from one worker
+    
+    Inference runs concurrently through the async client (bounded by
+    `concurrency` and the per-key rate limit); images whose stored raw
+    predictions already cover the threshold skip inference. Rendering and
+    result write-back then run per image. In tiled mode (tiled, defaulting
+    to ML_TILED_INFERENCE) each image instead goes through predict_tiled,
+    which posts its tiles concurrently.
+    """
+    try:
+        confidence_threshold, min_detection_size, max_detections = processing_parameters(confidence_threshold, min_detection_size, max_detections)
+    except ValueError as e:
+        return {'error': str(e)}
+    images = [image for image in (image_store.get(image_id) for image_id in image_ids) if image]
+    print(f"Batch Roboflow processing of {len(images)} images (concurrency={concurrency or async_roboflow_client.concurrency})")
+    
+    tiled = settings.ML_TILED_INFERENCE if tiled is None else tiled
+    ml_config = {
+        'confidence_threshold': confidence_threshold,
+        'min_detection_size': min_detection_size,
+        'max_detections': max_detections,
+        'model': 'roboflow',
+        'tiled': tiled
+    }
+    for image in images:
+        image_store.update(image['image_id'], status='processing', ml_config=ml_config)
+    
+    model_id = tiled_model_id(roboflow_config.model_id) if tiled else roboflow_config.model_id
+    to_infer = [image for image in images if not can_rethreshold(image.get('raw_predictions'), model_id, confidence_threshold)]
+    roboflow_results = {}
+    if not tiled:
+        # Full-frame predictions can be fetched up front; tiled ones are made per image below
+        roboflow_results = dict(zip(
+            [image['image_id'] for image in to_infer],
+            async_roboflow_client.predict_many_sync(
+                [image['image_url'] for image in to_infer], min(settings.ML_CONFIDENCE_FLOOR, confidence_threshold), concurrency
+            )
+        ))
+    
+    summary = {'completed': 0, 'failed': 0, 'missing': len(image_ids) - len(images), 'inferred': len(to_infer)}
+    for image in images:
+        roboflow_result = roboflow_results.get(image['image_id'])
+        if roboflow_result is not None and 'error' in roboflow_result:
+            result = {'image_id': image['image_id'], 'error': roboflow_result['error'], 'status': 'failed'}
+        else:
+            result = process_image_with_roboflow_sync(
+                image['image_id'], image['image_url'], image.get('location', ''),
+                confidence_threshold, min_detection_size, max_detections,
+                roboflow_result=roboflow_result, raw_predictions=image.get('raw_predictions'), tiled=tiled
+            )
+        apply_ml_result(image['image_id'], result)
+        summary['completed' if result.get('status') == 'completed' else 'failed'] += 1
+    
+    print(f"Batch Roboflow processing finished: {summary}")
+    return summary
+
+# Backends whose models run in this process and accept a batch of images
+LOCAL_BATCH_BACKENDS = ('onnx', 'yolo')
+
+def detect_batch(backend: str, images: list, confidence_threshold: float):
+    """
+    Run one batched forward pass of a local model
+    
+    Returns:
+        (model_id, model_used, Roboflow-style result per image)
+    """
+    if backend == 'onnx':
+        return onnx_detector.model_id, 'ONNX Runtime Local Model', onnx_detector.predict_batch(images, confidence_threshold)
+    if backend == 'yolo':
+        return YOLO_MODEL_ID, 'YOLOv8 Local Model', model_registry.predict_batch(images, confidence_threshold)
+    raise ValueError(f"Unsupported batch backend: {backend}")
+
+@shared_task
+def process_image_batch(image_ids: list, backend: str = 'onnx', confidence_threshold: float = 0.1, min_detection_size: int = 20, max_detections: int = 50, render: bool = None):
+    """
+    Reprocess many stored images with a local model in batched forward passes
+    
+    Images are handled ML_BATCH_SIZE at a time: downloaded concurrently,
+    decoded, run through the model in one call, and the results written back
+    per image.
+    """
+    if backend not in LOCAL_BATCH_BACKENDS:
+        return {'error': f"Batched inference needs a local backend ({', '.join(LOCAL_BATCH_BACKENDS)}), got '{backend}'"}
+    try:
+        confidence_threshold, min_detection_size, max_detections = processing_parameters(confidence_threshold, min_detection_size, max_detections)
+    except ValueError as e:
+        return {'error': str(e)}
+    
+    images = [image for image in (image_store.get(image_id) for image_id in image_ids) if image]
+    print(f"Batched {backend} processing of {len(images)} images (batch size {settings.ML_BATCH_SIZE})")
+    
+    ml_config = {
+        'confidence_threshold': confidence_threshold,
+        'min_detection_size': min_detection_size,
+        'max_detections': max_detections,
+        'model': backend,
+        'tiled': False
+    }
+    summary = {'completed': 0, 'failed': 0, 'missing': len(image_ids) - len(images), 'batches': 0}
+    floor = min(settings.ML_CONFIDENCE_FLOOR, float(confidence_threshold))
+    
+    with ThreadPoolExecutor(max_workers=settings.ML_BATCH_DOWNLOAD_WORKERS) as pool:
+        for start in range(0, len(images), settings.ML_BATCH_SIZE):
+            chunk = images[start:start + settings.ML_BATCH_SIZE]
+            for image in chunk:
+                image_store.update(image['image_id'], status='processing', ml_config=ml_config)
+            
+            # Download concurrently; a failed download only fails its own image
+            downloads = [pool.submit(download_image_from_url, image['image_url']) for image in chunk]
+            results, ready = {}, []
+            for image, download in zip(chunk, downloads):
+                try:
+                    image_bytes = download.result()
+                    with Image.open(io.BytesIO(image_bytes)) as decoded:
+                        ready.append((image, image_bytes, decoded.convert('RGB')))
+                except Exception as e:
+                    print(f"Error loading image {image['image_id']} for batch: {str(e)}")
+                    results[image['image_id']] = {'image_id': image['image_id'], 'error': str(e), 'status': 'failed'}
+            
+            if ready:
+                try:
+                    model_id, model_used, detections = detect_batch(backend, [decoded for _, _, decoded in ready], floor)
+                    summary['batches'] += 1
+                    
+                    # Fan results back out; rendering and uploads overlap across images
+                    finished = [
+                        pool.submit(
+                            finish_local_result, image['image_id'], image['image_url'], io.BytesIO(image_bytes),
+                            compact_predictions(detection, floor, model_id), model_id, model_used,
+                            confidence_threshold, min_detection_size, max_detections, render
+                        )
+                        for (image, image_bytes, _), detection in zip(ready, detections)
+                    ]
+                    for (image, _, _), future in zip(ready, finished):
+                        results[image['image_id']] = future.result()
+                except Exception as e:
+                    print(f"Batched inference failed: {str(e)}")
+                    for image, _, _ in ready:
+                        results[image['image_id']] = {'image_id': image['image_id'], 'error': str(e), 'status': 'failed'}
+            
+            for image in chunk:
+                result = results[image['image_id']]
+                apply_ml_result(image['image_id'], result)
+                summary['completed' if result.get('status') == 'completed' else 'failed'] += 1
+    
+    print(f"Batched {backend} processing finished: {summary}")
+    return summary
@@ -1,3 +1,361 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from images import store as store_module
+from images.store import InMemoryImageRepository
+from roboflow_config import roboflow_config
+from . import tasks
+from .batcher import MicroBatcher, onnx_batcher
+from .cache import inference_cache
+from .onnx_backend import OnnxDetector, letterbox
+from .postprocess import Detections, nms, class_nms, filter_detections
+from .tiling import tile_grid, predict_tiled, tiled_model_id
+from .predictions import compact_predictions, rethreshold, can_rethreshold, processing_parameters
+
+# Optional: only needed for the local ONNX backend
+try:
+    import onnx
+    import onnxruntime
+except ImportError:
+    onnx = onnxruntime = None
+
+
+def jpeg_bytes(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'gray').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def prediction(x, y, width, height, confidence=0.9, class_name='Plastic'):
+    return {'x': x, 'y': y, 'width': width, 'height': height, 'confidence': confidence, 'class': class_name}
+
+
+class InferenceCacheStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_clearing_requires_admin(self):
+        with mock.patch.object(inference_cache, 'clear') as clear:
+            self.assertEqual(self.client.delete('/api/ml/cache/').status_code, 403)
+            self.assertEqual(self.client.delete('/api/ml/cache/?user_id=user-1').status_code, 403)
+            clear.assert_not_called()
+
+            self.assertEqual(self.client.delete('/api/ml/cache/?user_id=1').status_code, 200)
+            clear.assert_called_once()
+
+        self.assertEqual(self.client.get('/api/ml/cache/').status_code, 200)
+
+
+class MicroBatcherTests(TestCase):
+    def test_concurrent_requests_share_a_batch(self):
+        batch_sizes = []
+        release = threading.Event()
+
+        def predict_batch(images, confidence_threshold):
+            release.wait(5)
+            batch_sizes.append(len(images))
+            return [{'predictions': [prediction(1, 1, 1, 1, 0.5)]} for _ in images]
+
+        batcher = MicroBatcher(predict_batch, max_batch_size=4, max_wait_ms=200, name='test')
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(batcher.predict, Image.new('RGB', (8, 8)), threshold) for threshold in (0.1, 0.1, 0.9, 0.1)]
+            release.set()
+            responses = [future.result(5) for future in futures]
+
+        self.assertEqual(sum(batch_sizes), 4)
+        self.assertLess(len(batch_sizes), 4)
+        # The batch ran at the lowest threshold and was filtered back per caller
+        self.assertEqual([len(response['predictions']) for response in responses], [1, 1, 0, 1])
+
+    def test_errors_reach_every_caller(self):
+        batcher = MicroBatcher(lambda images, threshold: 1 / 0, max_batch_size=2, max_wait_ms=1, name='failing')
+        with self.assertRaises(ZeroDivisionError):
+            batcher.predict(Image.new('RGB', (8, 8)))
+
+    def test_disabled_without_a_wait(self):
+        predict_batch = mock.Mock(return_value=[{'predictions': []}])
+        batcher = MicroBatcher(predict_batch, max_batch_size=8, max_wait_ms=0, name='direct')
+        self.assertFalse(batcher.enabled)
+        batcher.predict(Image.new('RGB', (8, 8)), 0.3)
+        predict_batch.assert_called_once()
+        self.assertIsNone(batcher._thread)
+
+    def test_resetting_stats_requires_admin(self):
+        client = APIClient()
+        with mock.patch.object(onnx_batcher, 'reset_stats') as reset_stats:
+            self.assertEqual(client.delete('/api/ml/batcher/?user_id=user-1').status_code, 403)
+            reset_stats.assert_not_called()
+            self.assertEqual(client.delete('/api/ml/batcher/?user_id=1').status_code, 200)
+            reset_stats.assert_called_once()
+
+
+class NMSTests(TestCase):
+    def test_iou_suppresses_overlapping_boxes_only(self):
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]], dtype=float)
+        scores = np.array([0.9, 0.8, 0.7])
+        self.assertEqual(nms(boxes, scores, 0.5).tolist(), [0, 2])
+        # IoU of the first two boxes is 81/119, so a higher threshold keeps both
+        self.assertEqual(nms(boxes, scores, 0.7).tolist(), [0, 1, 2])
+
+    def test_classes_never_suppress_each_other(self):
+        boxes = np.array([[0, 0, 10, 10], [0, 0, 10, 10]], dtype=float)
+        scores = np.array([0.9, 0.8])
+        self.assertEqual(nms(boxes, scores, 0.5, classes=np.array([0, 1])).tolist(), [0, 1])
+        self.assertEqual(nms(boxes, scores, 0.5, classes=np.array([1, 1])).tolist(), [0])
+
+    def test_class_nms_and_filtering(self):
+        detections = Detections.from_predictions([
+            prediction(50, 50, 20, 20, 0.9), prediction(51, 51, 20, 20, 0.6),
+            prediction(50, 50, 20, 20, 0.8, 'Metal'), prediction(200, 200, 4, 4, 0.95),
+        ])
+        kept = class_nms(detections, 0.5)
+        self.assertEqual(sorted(kept.scores.round(2).tolist()), [0.8, 0.9, 0.95])
+
+        filtered = filter_detections(detections, confidence_threshold=0.7, min_detection_size=10, max_detections=2)
+        self.assertEqual(filtered.scores.round(2).tolist(), [0.9, 0.8])
+
+
+class TilingTests(TestCase):
+    def test_grid_covers_image_with_edge_aligned_tiles(self):
+        tiles = tile_grid(1500, 1000, 640, 128)
+        covered = np.zeros((1000, 1500), dtype=bool)
+        for left, upper, right, lower in tiles:
+            self.assertEqual((right - left, lower - upper), (640, 640))
+            covered[upper:lower, left:right] = True
+        self.assertTrue(covered.all())
+        self.assertEqual(tile_grid(500, 400, 640, 128), [(0, 0, 500, 400)])
+
+    def test_ios_merges_a_box_cut_off_inside_another(self):
+        # A partial box at a tile edge: small IoU with the full box, but entirely inside it
+        boxes = np.array([[0, 0, 100, 100], [80, 0, 100, 100]], dtype=float)
+        scores = np.array([0.9, 0.8])
+        self.assertEqual(nms(boxes, scores, 0.5, metric='iou').tolist(), [0, 1])
+        self.assertEqual(nms(boxes, scores, 0.5, metric='ios').tolist(), [0])
+
+    def test_box_split_across_tiles_is_merged(self):
+        image = Image.new('RGB', (1200, 640))
+
+        # The full frame sees the whole object (x 500-700); each tile sees the half on its side of x=600
+        frames = iter([prediction(600, 320, 200, 100), prediction(550, 320, 100, 100, 0.7), prediction(50, 320, 100, 100, 0.7)])
+
+        def predict_batch(images, confidence_threshold):
+            return [{'predictions': [next(frames)]} for _ in images]
+
+        with mock.patch('ml_service.tiling.tile_grid', return_value=[(0, 0, 600, 640), (600, 0, 1200, 640)]):
+            result = predict_tiled(image, predict_batch, 0.1, tile_size=640, overlap=0, batch_size=2,
+                                   merge_threshold=0.5)
+
+        self.assertEqual(result['image'], {'width': 1200, 'height': 640})
+        self.assertEqual(len(result['predictions']), 1)
+        self.assertAlmostEqual(result['predictions'][0]['confidence'], 0.9)
+
+    @override_settings(ML_TILED_INFERENCE=True, EAGER_PROCESSED_UPLOAD=False)
+    def test_roboflow_batch_runs_tiled_inference(self):
+        store = InMemoryImageRepository()
+        store.add({'image_id': 'image-0', 'image_url': 'https://cdn.example/0.jpg', 'location': 'Park',
+                   'uploaded_at': '2026-01-01T12:00:00+00:00', 'status': 'completed'})
+        tiled_result = {'image': {'width': 80, 'height': 60}, 'predictions': [prediction(40, 30, 30, 30, 0.8)]}
+
+        with mock.patch.object(tasks, 'image_store', store), mock.patch.object(store_module, 'image_store', store), \
+                mock.patch.object(tasks, 'download_image_from_url', return_value=jpeg_bytes(80, 60)), \
+                mock.patch.object(tasks, 'predict_tiled', return_value=tiled_result) as tiled, \
+                mock.patch.object(tasks.async_roboflow_client, 'predict_many_sync') as full_frame:
+            tasks.process_images_with_roboflow_batch(['image-0'], min_detection_size=0)
+
+        full_frame.assert_not_called()
+        tiled.assert_called_once()
+        record = store.get('image-0')
+        self.assertEqual(record['raw_predictions']['model_id'], tiled_model_id(roboflow_config.model_id))
+        self.assertTrue(record['ml_config']['tiled'])
+
+
+class StoredPredictionTests(TestCase):
+    def test_processing_parameters_coerce_form_values(self):
+        self.assertEqual(processing_parameters('0.6', '20', '50.0'), (0.6, 20, 50))
+        with self.assertRaises(ValueError):
+            processing_parameters('high', 20, 50)
+
+    def test_rethreshold_matches_filtering_the_response(self):
+        response = {'image': {'width': 100, 'height': 100},
+                    'predictions': [prediction(10, 10, 30, 30, 0.2), prediction(60, 60, 30, 30, 0.8, 'Metal')]}
+        raw = compact_predictions(response, 0.05, 'model/1')
+        self.assertTrue(can_rethreshold(raw, 'model/1', 0.5))
+        self.assertFalse(can_rethreshold(raw, 'model/1+tiles640o128', 0.5))
+        self.assertFalse(can_rethreshold(raw, 'model/1', 0.01))
+        kept = rethreshold(raw, 0.5)
+        self.assertEqual([prediction['class'] for prediction in kept.to_predictions()], ['Metal'])
+
+
+@override_settings(ML_TILED_INFERENCE=False)
+class RethresholdRenderTests(TestCase):
+    """A render from stored predictions scales boxes from the inference frame to the downloaded copy"""
+
+    def test_boxes_are_scaled_to_the_stored_copy(self):
+        raw_predictions = {'model_id': roboflow_config.model_id, 'floor': 0.05, 'image': {'width': 1800, 'height': 1200},
+                           'classes': ['Plastic'], 'boxes': [[1700.0, 1100.0, 100.0, 100.0, 0.9, 0]]}
+
+        with mock.patch.object(tasks, 'download_image_from_url', return_value=jpeg_bytes(800, 533)), \
+                mock.patch.object(tasks, 'upload_processed_image', return_value='https://cdn.example/p.jpg'), \
+                mock.patch.object(roboflow_config, 'predict_image_from_url') as predict, \
+                mock.patch('ml_service.renderer.draw_detections', side_effect=lambda image, predictions, threshold: image) as draw:
+            result = tasks.process_image_with_roboflow_sync('image', 'https://cdn.example/i.jpg', min_detection_size=0,
+                                                            raw_predictions=raw_predictions, render=True)
+
+        predict.assert_not_called()
+        self.assertEqual(result['processed_image_url'], 'https://cdn.example/p.jpg')
+        image, drawn, _ = draw.call_args[0]
+        self.assertEqual(image.size, (800, 533))
+        self.assertAlmostEqual(drawn[0]['x'], 1700 * 800 / 1800)
+        self.assertAlmostEqual(drawn[0]['y'], 1100 * 533 / 1200)
+        self.assertAlmostEqual(drawn[0]['height'], 100 * 533 / 1200)
+
+
+def write_detector_model(path, outputs, names):
+    """
+    Save a tiny ONNX model that returns the same raw YOLOv8 output for every image in the batch
+
+    outputs has shape (4 + num_classes, anchors), boxes as centre x/y, width and height
+    in letterboxed input pixels.
+    """
+    from onnx import TensorProto, helper, numpy_helper
+
+    constant = numpy_helper.from_array(np.asarray(outputs, dtype=np.float32)[None], 'raw')
+    tail = numpy_helper.from_array(np.array(constant.dims[1:], dtype=np.int64), 'tail')
+    nodes = [
+        helper.make_node('Shape', ['images'], ['input_shape']),
+        helper.make_node('Slice', ['input_shape', 'zero', 'one'], ['batch']),
+        helper.make_node('Concat', ['batch', 'tail'], ['output_shape'], axis=0),
+        helper.make_node('Expand', ['raw', 'output_shape'], ['output0']),
+    ]
+    graph = helper.make_graph(
+        nodes, 'detector',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, ['batch', 3, 'height', 'width'])],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, ['batch', *constant.dims[1:]])],
+        initializer=[constant, tail, numpy_helper.from_array(np.array([0], dtype=np.int64), 'zero'),
+                     numpy_helper.from_array(np.array([1], dtype=np.int64), 'one')]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    helper.set_model_props(model, {'names': repr(dict(enumerate(names)))})
+    onnx.save(model, path)
+
+
+@skipUnless(onnx and onnxruntime, 'onnx and onnxruntime are not installed')
+@override_settings(ONNX_INPUT_SIZE=64, ONNX_IOU_THRESHOLD=0.45, ONNX_CLASS_NAMES='', ONNX_THREADS=0)
+class OnnxBackendTests(TestCase):
+    """A 200x100 photo letterboxes into 64x64 at ratio 0.32 with 16 pixels of padding above and below"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.model_path = os.path.join(directory, 'detector.onnx')
+        # Anchors: an object at (100, 50) sized 50x25 in the photo, a weaker duplicate of it,
+        # and a low-confidence box of the second class
+        write_detector_model(self.model_path, [
+            [32.0, 32.5, 10.0],
+            [32.0, 32.0, 40.0],
+            [16.0, 16.0, 8.0],
+            [8.0, 8.0, 4.0],
+            [0.9, 0.6, 0.0],
+            [0.0, 0.1, 0.05],
+        ], names=['Plastic', 'Metal'])
+        self.detector = OnnxDetector(self.model_path)
+
+    def test_letterbox_maps_pixels_into_the_padded_square(self):
+        image = Image.new('RGB', (200, 100), 'white')
+        image.paste((0, 0, 0), (80, 40, 120, 60))
+
+        tensor, ratio, pad = letterbox(image, 64)
+        self.assertEqual(tensor.shape, (3, 64, 64))
+        self.assertAlmostEqual(ratio, 0.32)
+        self.assertEqual(pad, (0, 16))
+        # Padding rows, the black box at (100, 50) -> (32, 32), and white image content
+        self.assertAlmostEqual(float(tensor[0, 8, 32]), 114 / 255, places=5)
+        self.assertLess(float(tensor[:, 32, 32].max()), 0.1)
+        self.assertGreater(float(tensor[:, 20, 5].min()), 0.9)
+
+    def test_decode_maps_boxes_back_to_the_original_frame(self):
+        responses = self.detector.predict_batch([Image.new('RGB', (200, 100)), Image.new('RGB', (200, 100))], 0.3)
+
+        self.assertEqual(len(responses), 2)
+        for response in responses:
+            self.assertEqual(response['image'], {'width': 200, 'height': 100})
+            self.assertEqual(len(response['predictions']), 1)
+            box = response['predictions'][0]
+            self.assertEqual(box['class'], 'Plastic')
+            self.assertAlmostEqual(box['confidence'], 0.9, places=5)
+            for key, expected in (('x', 100), ('y', 50), ('width', 50), ('height', 25)):
+                self.assertAlmostEqual(box[key], expected, places=3)
+
+    def test_backend_task_returns_the_analysis_shape(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (200, 100)).save(buffer, 'JPEG')
+
+        with mock.patch.object(tasks, 'onnx_detector', self.detector), \
+                mock.patch.object(tasks.onnx_batcher, 'predict_batch', self.detector.predict_batch):
+            result = tasks.process_image_with_onnx_sync('image', None, confidence_threshold=0.3, min_detection_size=0,
+                                                        image_bytes=buffer.getvalue(), render=False, tiled=False)
+
+        self.assertEqual(result['status'], 'completed')
+        self.assertEqual(result['analysis_results']['total_detections'], 1)
+        self.assertEqual(result['analysis_results']['waste_types'], {'Plastic': 1})
+        self.assertEqual(result['raw_predictions']['image'], {'width': 200, 'height': 100})
+
+
+@override_settings(ML_TILED_INFERENCE=False, EAGER_PROCESSED_UPLOAD=False, ML_BATCH_SIZE=2)
+class DetectionSchemaTests(TestCase):
+    """Every backend and path stores the same detection schema and ml_config keys"""
+
+    def setUp(self):
+        self.store = InMemoryImageRepository()
+        for module in (tasks, store_module):
+            patcher = mock.patch.object(module, 'image_store', self.store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for index in range(3):
+            self.store.add({'image_id': f'image-{index}', 'image_url': f'https://cdn.example/{index}.jpg', 'location': 'Park',
+                            'uploaded_at': f'2026-01-01T12:0{index}:00+00:00', 'status': 'completed'})
+
+    def detect(self, images, confidence_threshold):
+        return [{'image': {'width': image.width, 'height': image.height},
+                 'predictions': [prediction(40, 30, 30, 30, 0.8, 'bottle'), prediction(10, 10, 4, 4, 0.9, 'cup')]}
+                for image in images]
+
+    def test_single_and_batched_yolo_results_match(self):
+        with mock.patch.object(tasks.model_registry, 'get'), \
+                mock.patch.object(tasks.model_registry, 'predict_batch', side_effect=self.detect), \
+                mock.patch.object(tasks, 'download_image_from_url', return_value=jpeg_bytes(80, 60)):
+            single = tasks.process_image_with_yolo_sync('image-0', 'https://cdn.example/0.jpg', min_detection_size=20)
+            summary = tasks.process_image_batch(['image-0', 'image-1', 'image-2'], backend='yolo', min_detection_size=20)
+
+        self.assertEqual(summary['completed'], 3)
+        self.assertEqual(summary['batches'], 2)
+        detections = single['analysis_results']['detections']
+        self.assertEqual(detections, [prediction(40, 30, 30, 30, 0.8, 'bottle')])
+        self.assertEqual(single['raw_predictions']['image'], {'width': 80, 'height': 60})
+        for index in range(3):
+            record = self.store.get(f'image-{index}')
+            self.assertEqual(record['analysis_results']['detections'], detections)
+            self.assertEqual(record['raw_predictions'], single['raw_predictions'])
+            self.assertEqual(record['ml_config']['model'], 'yolo')
+
+    def test_roboflow_batch_records_the_model(self):
+        with mock.patch.object(tasks.async_roboflow_client, 'predict_many_sync',
+                               side_effect=lambda urls, floor, concurrency: [self.detect([Image.new('RGB', (80, 60))], floor)[0] for _ in urls]), \
+                mock.patch.object(tasks, 'download_image_from_url', return_value=jpeg_bytes(80, 60)):
+            tasks.process_images_with_roboflow_batch(['image-0'], min_detection_size=20)
+
+        record = self.store.get('image-0')
+        self.assertEqual(record['ml_config'], {'confidence_threshold': 0.1, 'min_detection_size': 20, 'max_detections': 50,
+                                               'model': 'roboflow', 'tiled': False})
+        self.assertEqual(record['analysis_results']['detections'], [prediction(40, 30, 30, 30, 0.8, 'bottle')])
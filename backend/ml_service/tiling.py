@@ -0,0 +1,100 @@
+"""
+Tiled (sliced) inference for high-resolution photos
+
+Detectors see a downscaled frame, so small litter in a large phone photo can
+vanish. In tiled mode the image is also cut into overlapping tiles at the
+model's native size. Tiles are streamed through a batch predictor a few at a
+time, so only ML_TILE_BATCH crops exist at once. Their boxes are shifted back
+to image coordinates and merged with the full-frame boxes by class-aware NMS.
+"""
+
+import itertools
+from typing import Callable, Dict, List, Any
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .postprocess import Detections, class_nms
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: int):
+    """
+    Overlapping tile boxes (left, upper, right, lower) covering the image
+
+    The last tile in each row and column is aligned to the image edge, so
+    every tile except those of small images is tile_size square.
+    """
+    step = max(1, tile_size - overlap)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        return list(range(0, length - tile_size, step)) + [length - tile_size]
+
+    return [
+        (left, upper, min(left + tile_size, width), min(upper + tile_size, height))
+        for upper in starts(height)
+        for left in starts(width)
+    ]
+
+
+def iter_tiles(image: Image.Image, tile_size: int, overlap: int, include_full_frame: bool = True):
+    """Yield (offset_x, offset_y, crop) lazily, the full frame first when requested"""
+    if include_full_frame:
+        yield 0, 0, image
+    for box in tile_grid(image.width, image.height, tile_size, overlap):
+        yield box[0], box[1], image.crop(box)
+
+
+def tiled_model_id(model_id: str) -> str:
+    """Model id recorded for tiled predictions, so they are never mixed with full-frame ones"""
+    return f"{model_id}+tiles{settings.ML_TILE_SIZE}o{settings.ML_TILE_OVERLAP}"
+
+
+def predict_tiled(image: Image.Image, predict_batch: Callable[[List[Image.Image], float], List[Dict[str, Any]]],
+                  confidence_threshold: float = 0.1, tile_size: int = None, overlap: int = None,
+                  batch_size: int = None, merge_threshold: float = None) -> Dict[str, Any]:
+    """
+    Detect objects over overlapping tiles plus the full frame
+
+    predict_batch(images, confidence_threshold) returns one Roboflow-style
+    response per image, with boxes in that image's pixels.
+
+    Returns:
+        Roboflow-style response for the whole image
+    """
+    tile_size = tile_size or settings.ML_TILE_SIZE
+    overlap = settings.ML_TILE_OVERLAP if overlap is None else overlap
+    batch_size = batch_size or settings.ML_TILE_BATCH
+    merge_threshold = settings.ML_TILE_MERGE_THRESHOLD if merge_threshold is None else merge_threshold
+
+    width, height = image.size
+    if width <= tile_size and height <= tile_size:
+        # A single tile would just repeat the full frame
+        return predict_batch([image], confidence_threshold)[0]
+
+    boxes, scores, labels = [], [], []
+    tiles = iter_tiles(image, tile_size, overlap)
+    while True:
+        chunk = list(itertools.islice(tiles, batch_size))
+        if not chunk:
+            break
+        responses = predict_batch([crop for _, _, crop in chunk], confidence_threshold)
+        for (offset_x, offset_y, _), response in zip(chunk, responses):
+            if 'error' in response:
+                raise RuntimeError(response['error'])
+            detections = Detections.from_predictions(response.get('predictions', []))
+            boxes.append(detections.boxes + (offset_x, offset_y, 0, 0))
+            scores.append(detections.scores)
+            labels.extend(detections.class_names[class_id] for class_id in detections.class_ids.tolist())
+
+    class_names, class_ids = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)
+    merged = class_nms(
+        Detections(np.concatenate(boxes), np.concatenate(scores), class_ids, class_names.tolist()),
+        merge_threshold,
+        metric='ios'
+    )
+    return {
+        'image': {'width': width, 'height': height},
+        'predictions': merged.to_predictions(),
+    }
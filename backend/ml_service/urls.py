@@ -2,6 +2,7 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    # Add ML service URLs here when needed
-    # For now, keeping it empty to avoid import errors
-] 
\ No newline at end of file
+    path('cache/', views.inference_cache_stats, name='inference_cache_stats'),
+    path('models/', views.loaded_models, name='loaded_models'),
+    path('batcher/', views.batcher_stats, name='batcher_stats'),
+]
@@ -1,3 +1,65 @@
-from django.shortcuts import render
+import os
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from images.views import is_admin_request
 
-# Create your views here.
+from .cache import inference_cache
+from .registry import model_registry
+from .batcher import onnx_batcher
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([AllowAny])
+def inference_cache_stats(request):
+    """Hit/miss counters of the inference cache; DELETE clears this process's tier (admin only)"""
+    try:
+        if request.method == 'DELETE':
+            if not is_admin_request(request):
+                return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+            inference_cache.clear()
+        return Response({
+            'success': True,
+            'data': inference_cache.stats()
+        })
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def loaded_models(request):
+    """
+    YOLO models loaded in this web process and their memory footprint (admin only)
+    
+    Celery workers keep their own registries, which this endpoint cannot see.
+    """
+    try:
+        if not is_admin_request(request):
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+        return Response({
+            'success': True,
+            'data': model_registry.loaded(),
+            'process': os.getpid(),
+            'note': 'Models loaded in this web process only; each Celery worker process keeps its own'
+        })
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([AllowAny])
+def batcher_stats(request):
+    """Batch-size and queue-wait histograms of the ONNX micro-batcher; DELETE resets them (admin only)"""
+    try:
+        if request.method == 'DELETE':
+            if not is_admin_request(request):
+                return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+            onnx_batcher.reset_stats()
+        return Response({
+            'success': True,
+            'data': onnx_batcher.stats()
+        })
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
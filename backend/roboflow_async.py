@@ -0,0 +1,154 @@
+import os
+import time
+import random
+import asyncio
+import base64
+from typing import Dict, List, Any, Union
+from dotenv import load_dotenv
+
+from roboflow_config import roboflow_config
+from http_client import http_client, RETRY_STATUSES
+
+try:
+    # Optional: only needed for batch inference
+    import httpx
+except ImportError:
+    httpx = None
+
+load_dotenv()
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter for coroutines on one event loop
+
+    Refills at `rate` tokens per second up to `capacity`, so short bursts are
+    allowed while the sustained request rate stays under the API quota.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# One bucket per API key, shared by every client in the process
+_buckets: Dict[str, TokenBucket] = {}
+
+
+def get_rate_limiter(api_key: str, rate: float, capacity: float) -> TokenBucket:
+    bucket = _buckets.get(api_key)
+    if bucket is None:
+        bucket = _buckets[api_key] = TokenBucket(rate, capacity)
+    return bucket
+
+
+class AsyncRoboflowClient:
+    """
+    Asyncio Roboflow client for inferring many images concurrently
+
+    Uses the API key, model and endpoint of RoboflowConfig and returns the same
+    result dictionaries as its predict_* methods.
+    """
+
+    def __init__(self, config=roboflow_config):
+        self.config = config
+        self.concurrency = int(os.getenv('ROBOFLOW_CONCURRENCY', '16'))
+        self.rate_limit = float(os.getenv('ROBOFLOW_RATE_LIMIT', '10'))
+        self.rate_burst = float(os.getenv('ROBOFLOW_RATE_BURST', '20'))
+
+    def _url(self) -> str:
+        return f"{self.config.api_url}/{self.config.model_id}"
+
+    async def _predict(self, client, limiter, semaphore, source: Union[str, bytes], confidence_threshold: float) -> Dict[str, Any]:
+        params = {
+            "api_key": self.config.api_key,
+            "confidence": confidence_threshold
+        }
+        data = None
+        if isinstance(source, (bytes, bytearray)):
+            data = base64.b64encode(source).decode('utf-8')
+        else:
+            params["image"] = source
+
+        async with semaphore:
+            try:
+                for attempt in range(http_client.max_retries + 1):
+                    await limiter.acquire()
+                    response = await client.post(
+                        self._url(),
+                        content=data,
+                        headers={"Content-Type": "application/x-www-form-urlencoded"},
+                        params=params
+                    )
+                    if response.status_code not in RETRY_STATUSES or attempt == http_client.max_retries:
+                        break
+                    # Jittered exponential backoff, same policy as the sync session
+                    delay = http_client.backoff_factor * (2 ** attempt) + random.uniform(0, http_client.backoff_jitter)
+                    await asyncio.sleep(min(delay, http_client.backoff_max))
+
+                if response.status_code == 200:
+                    return response.json()
+                error_msg = f"API request failed with status {response.status_code}: {response.text}"
+                print(f"ERROR: {error_msg}")
+                return {"error": error_msg, "predictions": []}
+
+            except Exception as e:
+                error_msg = f"Error in async Roboflow prediction: {str(e)}"
+                print(f"ERROR: {error_msg}")
+                return {"error": error_msg, "predictions": []}
+
+    async def predict_many(self, sources: List[Union[str, bytes]], confidence_threshold: float = 0.1, concurrency: int = None) -> List[Dict[str, Any]]:
+        """
+        Predict waste detection on many images concurrently
+
+        Args:
+            sources: Image URLs (fetched by Roboflow) or encoded image bytes
+            confidence_threshold: Minimum confidence threshold (0.0 to 1.0, default 0.1 = 10%)
+            concurrency: Maximum in-flight requests (default ROBOFLOW_CONCURRENCY)
+
+        Returns:
+            Prediction dictionaries in the same order as sources
+        """
+        if not self.config.api_key:
+            error_msg = "Roboflow API key not configured. Please set ROBOFLOW_API_KEY environment variable."
+            print(f"ERROR: {error_msg}")
+            return [{"error": error_msg, "predictions": []} for _ in sources]
+        if httpx is None:
+            error_msg = "httpx is not installed; async Roboflow inference is unavailable"
+            print(f"ERROR: {error_msg}")
+            return [{"error": error_msg, "predictions": []} for _ in sources]
+
+        concurrency = max(1, concurrency or self.concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+        limiter = get_rate_limiter(self.config.api_key, self.rate_limit, self.rate_burst)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        timeout = httpx.Timeout(http_client.read_timeout, connect=http_client.connect_timeout)
+
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+            return await asyncio.gather(*(
+                self._predict(client, limiter, semaphore, source, confidence_threshold)
+                for source in sources
+            ))
+
+    def predict_many_sync(self, sources: List[Union[str, bytes]], confidence_threshold: float = 0.1, concurrency: int = None) -> List[Dict[str, Any]]:
+        """Run predict_many from synchronous code (Celery tasks, management commands)"""
+        return asyncio.run(self.predict_many(sources, confidence_threshold, concurrency))
+
+
+# Create global instance
+async_roboflow_client = AsyncRoboflowClient()
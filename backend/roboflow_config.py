@@ -1,9 +1,10 @@
 import os
-import requests
 import base64
 from typing import Dict, List, Any
 from django.conf import settings
 from dotenv import load_dotenv
+from http_client import http_client
+from ml_service.postprocess import Detections, build_analysis
 
 load_dotenv()
 
@@ -39,9 +40,35 @@ class RoboflowConfig:
             Dictionary containing prediction results
         """
         try:
-            # Read and encode the image
             with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
+                return self.predict_image_bytes(image_file.read(), confidence_threshold)
+        except Exception as e:
+            print(f"Error in Roboflow prediction: {str(e)}")
+            return {"error": str(e)}
+    
+    def predict_image_bytes(self, image_bytes: bytes, confidence_threshold: float = 0.1) -> Dict[str, Any]:
+        """
+        Predict waste detection on in-memory image bytes using Roboflow API
+        
+        The bytes are posted directly, so Roboflow does not have to fetch the
+        image from storage again.
+        
+        Args:
+            image_bytes: Encoded image data (JPEG/PNG)
+            confidence_threshold: Minimum confidence threshold (0.0 to 1.0, default 0.1 = 10%)
+            
+        Returns:
+            Dictionary containing prediction results
+        """
+        try:
+            # Check if API key is available
+            if not self.api_key:
+                error_msg = "Roboflow API key not configured. Please set ROBOFLOW_API_KEY environment variable."
+                print(f"ERROR: {error_msg}")
+                return {"error": error_msg, "predictions": []}
+            
+            # Encode the image
+            image_data = base64.b64encode(image_bytes).decode('utf-8')
             
             # Prepare the API request
             url = f"{self.api_url}/{self.model_id}"
@@ -54,7 +81,7 @@ class RoboflowConfig:
             }
             
             # Make the API request
-            response = requests.post(
+            response = http_client.post(
                 url,
                 data=image_data,
                 headers=headers,
@@ -64,11 +91,14 @@ class RoboflowConfig:
             if response.status_code == 200:
                 return response.json()
             else:
-                raise Exception(f"API request failed with status {response.status_code}: {response.text}")
+                error_msg = f"API request failed with status {response.status_code}: {response.text}"
+                print(f"ERROR: {error_msg}")
+                return {"error": error_msg, "predictions": []}
                 
         except Exception as e:
-            print(f"Error in Roboflow prediction: {str(e)}")
-            return {"error": str(e)}
+            error_msg = f"Error in Roboflow prediction from bytes: {str(e)}"
+            print(f"ERROR: {error_msg}")
+            return {"error": error_msg, "predictions": []}
     
     def predict_image_from_url(self, image_url: str, confidence_threshold: float = 0.1) -> Dict[str, Any]:
         """
@@ -101,7 +131,7 @@ class RoboflowConfig:
             print(f"DEBUG: Roboflow API call - URL: {url}")
             print(f"DEBUG: Roboflow API call - Params: {params}")
             
-            response = requests.post(url, headers=headers, params=params, timeout=30)
+            response = http_client.post(url, headers=headers, params=params)
             
             print(f"DEBUG: Roboflow API response status: {response.status_code}")
             print(f"DEBUG: Roboflow API response text: {response.text[:500]}...")  # First 500 chars
@@ -134,37 +164,9 @@ class RoboflowConfig:
             if "error" in predictions:
                 return predictions
             
-            # Extract predictions
+            # Count waste types and average confidence with array operations
             detections = predictions.get("predictions", [])
-            
-            # Count different types of waste
-            waste_counts = {}
-            total_confidence = 0
-            total_detections = len(detections)
-            
-            for detection in detections:
-                class_name = detection.get("class", "unknown")
-                confidence = detection.get("confidence", 0)
-                
-                if class_name not in waste_counts:
-                    waste_counts[class_name] = 0
-                waste_counts[class_name] += 1
-                total_confidence += confidence
-            
-            # Calculate average confidence
-            avg_confidence = total_confidence / total_detections if total_detections > 0 else 0
-            
-            # Format results
-            analysis_results = {
-                "total_detections": total_detections,
-                "average_confidence": round(avg_confidence, 3),
-                "waste_types": waste_counts,
-                "detections": detections,
-                "model_used": self.model_id,
-                "model_accuracy": ""
-            }
-            
-            return analysis_results
+            return build_analysis(Detections.from_predictions(detections), self.model_id, detections)
             
         except Exception as e:
             print(f"Error analyzing predictions: {str(e)}")
@@ -186,6 +188,9 @@ except Exception as e:
         def predict_image_from_url(self, image_url, confidence_threshold=0.1):
             return {"error": "Roboflow not configured", "predictions": []}
         
+        def predict_image_bytes(self, image_bytes, confidence_threshold=0.1):
+            return {"error": "Roboflow not configured", "predictions": []}
+        
         def analyze_predictions(self, predictions):
             return {"error": "Roboflow not configured", "total_detections": 0}
     
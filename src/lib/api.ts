@@ -225,8 +225,23 @@ class ApiClient {
 
   async getUserImages(): Promise<ApiResponse<ImageUpload[]>> {
     const user = authManager.getCurrentUser();
-    const url = user?.id ? `/images/list/?user_id=${user.id}` : '/images/list/';
-    return this.request(url);
+    // The list endpoint is paged; follow next_cursor until the last page
+    const images: ImageUpload[] = [];
+    let cursor: string | null = null;
+    let response: ApiResponse<any>;
+    do {
+      const params = new URLSearchParams();
+      if (user?.id) params.set('user_id', user.id);
+      if (cursor) params.set('cursor', cursor);
+      const query = params.toString();
+      response = await this.request(`/images/list/${query ? `?${query}` : ''}`);
+      if (!response.success || !response.data) {
+        return response;
+      }
+      images.push(...(response.data.data || []));
+      cursor = response.data.next_cursor || null;
+    } while (cursor);
+    return { ...response, data: { ...response.data, data: images, next_cursor: null } };
   }
 
   async getImageDetails(imageId: string): Promise<ApiResponse<ImageUpload>> {